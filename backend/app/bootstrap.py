@@ -0,0 +1,71 @@
+"""
+One-time database setup and per-process warm-up.
+
+prepare_database() creates missing tables and indexes and applies the exercise catalog.
+On Postgres it runs under a session-level advisory lock, so when several workers or
+containers start together one of them does the work and the others wait, then find
+nothing left to do. `python -m app.serve` also runs it once in the parent process
+before forking workers, which then skip it.
+
+warm_up() loads the per-process caches so the first requests a worker serves are not
+slower than the rest.
+"""
+import os
+
+from sqlalchemy import inspect, text
+
+from . import crud, database, exercise_search, models, partitions, seed, workout_generator
+
+# Any constant works as long as nothing else in the database uses it for an advisory lock
+SETUP_LOCK_ID = 746_172_551
+
+# Set by app.serve for its workers once the parent has prepared the database
+PREPARED_ENV = "FITIFY_DB_PREPARED"
+
+
+def _has_set_index(connection) -> bool:
+    return inspect(connection).has_index(models.WorkoutSessionLog.__tablename__, "uq_workout_session_logs_set")
+
+
+async def prepare_database():
+    async with database.engine.connect() as lock_connection:
+        locked = database.engine.dialect.name == "postgresql"
+        if locked:
+            await lock_connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SETUP_LOCK_ID})
+        try:
+            # Create all database tables based on our models
+            async with database.engine.begin() as conn:
+                await conn.run_sync(models.Base.metadata.create_all)
+                set_index_exists = await conn.run_sync(_has_set_index)
+
+            # Sets logged twice before the unique set index existed keep it from being created
+            if not set_index_exists:
+                async with database.SessionLocal() as db:
+                    duplicates = await crud.count_duplicate_session_logs(db)
+                if duplicates:
+                    raise RuntimeError(
+                        f"{duplicates} session logs repeat a set that was already logged, so the unique set index "
+                        "cannot be created. Review them with `python -m app.partitions dedupe --dry-run`, "
+                        "then delete them with `python -m app.partitions dedupe`."
+                    )
+
+            async with database.engine.begin() as conn:
+                await conn.run_sync(models.create_missing_indexes)
+                await partitions.prepare(conn)
+
+            # Seed the database with initial exercises and muscle groups
+            async with database.SessionLocal() as db:
+                await seed.seed_database(db)
+        finally:
+            if locked:
+                await lock_connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SETUP_LOCK_ID})
+
+
+def database_prepared() -> bool:
+    return os.getenv(PREPARED_ENV) == "1"
+
+
+async def warm_up():
+    async with database.read_session() as db:
+        await workout_generator.get_exercise_pool(db)
+        await exercise_search.get_index(db)
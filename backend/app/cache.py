@@ -0,0 +1,252 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple, Optional, Protocol
+
+from fastapi import Request, Response
+
+from . import serialization
+
+# Clients may keep a copy but must revalidate it with If-None-Match on every use
+CACHE_CONTROL = "public, no-cache"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """
+    Process-local cache of serialized JSON response bodies.
+
+    Entries are dropped as a whole by invalidate(). A generation counter makes sure a
+    response built from data read before an invalidation is never stored after it.
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, body: bytes, generation: int) -> CachedResponse:
+        entry = CachedResponse(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        if generation == self._generation:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+
+
+# Exercise library and workout templates; only written during seeding or admin edits
+library_cache = ResponseCache()
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def cached_json_response(
+    request: Request,
+    cache: ResponseCache,
+    key: Hashable,
+    serializer: serialization.Serializer,
+    load: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    Serves `key` from the cache, calling `load` and serializing with `serializer` on a miss.
+    Answers 304 Not Modified when the client already holds the current ETag.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        generation = cache.generation
+        body = serialization.to_json(serializer, await load())
+        entry = cache.set(key, body, generation)
+
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# --- Plan Document Cache ---
+
+class PlanCacheBackend(Protocol):
+    """Storage for pre-serialized plan documents. Mirrors the subset of the Redis API we use."""
+    async def get(self, key: str) -> Optional[bytes]: ...
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None) -> Any: ...
+    async def delete(self, key: str) -> Any: ...
+
+
+class InMemoryLRUBackend:
+    """
+    Process-local LRU storage; the default when no Redis URL is configured.
+    Like Redis, it drops entries once their `ex` seconds have passed.
+    """
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None):
+        self._entries[key] = (time.monotonic() + ex if ex is not None else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+
+class PlanCache:
+    """
+    Cache of each user's serialized GET /api/users/{user_id}/plan/ document.
+
+    Every plan mutation in crud calls invalidate(). Within a process, a per-user version
+    keeps a document built before an invalidation from being stored after it. Entries
+    expire after `ttl_seconds`, which bounds how long a change made by another process
+    (another worker, or a job run from the command line) can go unseen by an
+    in-memory cache, and how long a cross-process race can leave a stale document in
+    a shared one.
+    """
+    def __init__(self, backend: PlanCacheBackend, ttl_seconds: Optional[int] = 3600):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._versions: dict = {}
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"plan:{user_id}"
+
+    @property
+    def shared(self) -> bool:
+        """False for the process-local backend, whose entries other processes cannot drop."""
+        return not isinstance(self.backend, InMemoryLRUBackend)
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    async def get(self, user_id: int) -> Optional[bytes]:
+        return await self.backend.get(self._key(user_id))
+
+    async def set(self, user_id: int, document: bytes, version: int):
+        if version == self.version(user_id):
+            await self.backend.set(self._key(user_id), document, ex=self.ttl_seconds)
+
+    async def invalidate(self, user_id: int):
+        self._versions[user_id] = self.version(user_id) + 1
+        await self.backend.delete(self._key(user_id))
+
+
+def _create_plan_cache_backend() -> PlanCacheBackend:
+    redis_url = os.getenv("PLAN_CACHE_REDIS_URL")
+    if not redis_url:
+        return InMemoryLRUBackend(int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "10000")))
+    try:
+        import redis.asyncio as redis
+    except ImportError as exc:
+        raise RuntimeError("PLAN_CACHE_REDIS_URL is set but the 'redis' package is not installed") from exc
+    return redis.from_url(redis_url)
+
+
+plan_cache = PlanCache(
+    _create_plan_cache_backend(),
+    ttl_seconds=int(os.getenv("PLAN_CACHE_TTL_SECONDS", "300")),
+)
+
+
+# --- Weekly Volume Cache ---
+
+class WeeklyVolumeCache:
+    """
+    Process-local cache of each user's per-muscle-group volume, one entry per week.
+
+    Past weeks rarely change, so a new log only drops the entry of the week it falls
+    in. Like PlanCache, a per-entry version keeps a week computed before an
+    invalidation from being stored after it. Entries expire after `ttl_seconds` so
+    writes handled by other processes show up eventually.
+    """
+    def __init__(self, max_entries: int = 50_000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Versions are drawn from one counter so the map can be reset to a floor when it grows
+        self._counter = 0
+        self._floor = 0
+        self._versions: dict = {}
+
+    def version(self, user_id: int, week_start: date) -> int:
+        return self._versions.get((user_id, week_start), self._floor)
+
+    def get(self, user_id: int, week_start: date) -> Optional[list]:
+        key = (user_id, week_start)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, user_id: int, week_start: date, value: list, version: int):
+        key = (user_id, week_start)
+        if version != self.version(user_id, week_start):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, week_start: date):
+        key = (user_id, week_start)
+        self._counter += 1
+        if len(self._versions) >= self.max_entries:
+            # Every version handed out so far is now stale, which only costs a few cache misses
+            self._versions.clear()
+            self._floor = self._counter
+        else:
+            self._versions[key] = self._counter
+        self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id: Optional[int] = None):
+        """Drops every cached week of one user, or of all users."""
+        for key in [key for key in self._entries if user_id is None or key[0] == user_id]:
+            self.invalidate(*key)
+
+
+volume_cache = WeeklyVolumeCache(
+    max_entries=int(os.getenv("VOLUME_CACHE_MAX_ENTRIES", "50000")),
+    ttl_seconds=float(os.getenv("VOLUME_CACHE_TTL_SECONDS", "300")),
+)
@@ -1,10 +1,11 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func, delete
-from sqlalchemy.orm import selectinload
-from . import models, schemas
-from typing import List
-from datetime import date
+from sqlalchemy import func, delete, insert, update, tuple_, literal, literal_column, text, Integer, String
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import selectinload, joinedload
+from . import models, schemas, cache, database, notes_search, log_archive, partitions
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 
 # --- User CRUD ---
 
@@ -21,6 +22,17 @@ async def create_user(db: AsyncSession, user: schemas.UserCreate):
 
 # --- WorkoutPlan (High-Level) CRUD ---
 
+async def get_planned_user_ids(db: AsyncSession, after_id: int = 0, limit: int = 1000) -> List[int]:
+    """Returns the next page of IDs of users that have plan details, in ascending order."""
+    result = await db.execute(
+        select(models.WorkoutPlan.user_id)
+        .filter(models.WorkoutPlan.user_id > after_id)
+        .distinct()
+        .order_by(models.WorkoutPlan.user_id)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
 async def get_workout_plan_by_user(db: AsyncSession, user_id: int):
     result = await db.execute(select(models.WorkoutPlan).filter(models.WorkoutPlan.user_id == user_id))
     return result.scalars().first()
@@ -29,33 +41,28 @@ async def create_workout_plan(db: AsyncSession, user_id: int, plan: schemas.Work
     db_plan = models.WorkoutPlan(**plan.model_dump(), user_id=user_id)
     db.add(db_plan)
     await db.commit()
+    await _plan_changed(user_id)
     await db.refresh(db_plan)
     return db_plan
 
 # --- MuscleGroup & Exercise Library CRUD ---
 
-async def get_muscle_group_count(db: AsyncSession) -> int:
-    result = await db.execute(select(func.count(models.MuscleGroup.id)))
-    return result.scalar_one()
-
-async def create_muscle_group(db: AsyncSession, name: str):
-    db_group = models.MuscleGroup(name=name)
-    db.add(db_group)
-    await db.commit()
-    await db.refresh(db_group)
-    return db_group
-
-async def create_exercise(db: AsyncSession, name: str, type: str, muscle_group_id: int):
-    db_exercise = models.Exercise(name=name, type=type, muscle_group_id=muscle_group_id)
-    db.add(db_exercise)
-    await db.commit()
-    await db.refresh(db_exercise)
-    return db_exercise
-
 async def get_all_exercises(db: AsyncSession) -> List[models.Exercise]:
     result = await db.execute(select(models.Exercise))
     return result.scalars().all()
 
+async def get_exercise_pool_by_muscle_group(db: AsyncSession) -> Dict[str, List[models.Exercise]]:
+    """Loads the whole exercise library once, keyed by muscle group name."""
+    result = await db.execute(
+        select(models.Exercise, models.MuscleGroup.name)
+        .join(models.MuscleGroup)
+        .order_by(models.Exercise.id)
+    )
+    pool: Dict[str, List[models.Exercise]] = {}
+    for exercise, group_name in result.all():
+        pool.setdefault(group_name, []).append(exercise)
+    return pool
+
 async def get_exercises_by_muscle_groups(db: AsyncSession, group_names: List[str]) -> List[models.Exercise]:
     result = await db.execute(
         select(models.Exercise)
@@ -65,11 +72,27 @@ async def get_exercises_by_muscle_groups(db: AsyncSession, group_names: List[str
     return result.scalars().all()
 
 # --- Detailed Plan CRUD (WorkoutDay, WorkoutDayExercise) ---
+# Every function that changes a user's plan invalidates their cached plan document.
+
+async def get_workout_day_owner(db: AsyncSession, workout_day_id: int) -> Optional[int]:
+    result = await db.execute(select(models.WorkoutDay.user_id).filter(models.WorkoutDay.id == workout_day_id))
+    return result.scalar_one_or_none()
+
+async def _plan_changed(user_id: int):
+    """Called after a plan mutation commits: drops the cached plan and pins the user's reads to the primary."""
+    await cache.plan_cache.invalidate(user_id)
+    await database.note_user_write(user_id)
+
+async def _invalidate_plan_of_day(db: AsyncSession, workout_day_id: int):
+    user_id = await get_workout_day_owner(db, workout_day_id)
+    if user_id is not None:
+        await _plan_changed(user_id)
 
 async def create_workout_day(db: AsyncSession, user_id: int, day_of_week: str):
     db_day = models.WorkoutDay(user_id=user_id, day_of_week=day_of_week)
     db.add(db_day)
     await db.commit()
+    await _plan_changed(user_id)
     await db.refresh(db_day)
     return db_day
 
@@ -80,7 +103,9 @@ async def add_exercise_to_workout_day(db: AsyncSession, workout_day_id: int, exe
     )
     db.add(db_exercise)
     await db.commit()
-    await db.refresh(db_exercise)
+    await _invalidate_plan_of_day(db, workout_day_id)
+    # The response includes the library entry, which cannot be lazy-loaded later
+    await db.refresh(db_exercise, ["exercise"])
     return db_exercise
 
 async def get_workout_days_for_user(db: AsyncSession, user_id: int) -> List[models.WorkoutDay]:
@@ -99,6 +124,113 @@ async def delete_workout_days_for_user(db: AsyncSession, user_id: int):
     stmt = delete(models.WorkoutDay).where(models.WorkoutDay.user_id == user_id)
     await db.execute(stmt)
     await db.commit()
+    await _plan_changed(user_id)
+
+async def replace_workout_days_for_user(
+    db: AsyncSession,
+    user_id: int,
+    days: List[Tuple[str, List[schemas.WorkoutDayExerciseCreate]]],
+):
+    """
+    Replaces a user's whole weekly plan in a single transaction.
+    Old days are removed and the new days and their exercises are written with
+    two bulk inserts, so a failure never leaves a half-built week behind.
+    """
+    try:
+        old_day_ids = select(models.WorkoutDay.id).where(models.WorkoutDay.user_id == user_id)
+        await db.execute(delete(models.WorkoutDayExercise).where(models.WorkoutDayExercise.workout_day_id.in_(old_day_ids)))
+        await db.execute(delete(models.WorkoutDay).where(models.WorkoutDay.user_id == user_id))
+
+        if days:
+            result = await db.execute(
+                insert(models.WorkoutDay).returning(models.WorkoutDay.id, sort_by_parameter_order=True),
+                [{"user_id": user_id, "day_of_week": day_of_week} for day_of_week, _ in days],
+            )
+            day_ids = result.scalars().all()
+
+            exercise_rows = [
+                {"workout_day_id": day_id, **exercise.model_dump()}
+                for day_id, (_, exercises) in zip(day_ids, days)
+                for exercise in exercises
+            ]
+            if exercise_rows:
+                await db.execute(insert(models.WorkoutDayExercise), exercise_rows)
+
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    await _plan_changed(user_id)
+
+async def get_workout_day(db: AsyncSession, workout_day_id: int) -> Optional[models.WorkoutDay]:
+    """Fetches a workout day with its exercises and their library entries loaded."""
+    result = await db.execute(
+        select(models.WorkoutDay)
+        .filter(models.WorkoutDay.id == workout_day_id)
+        .options(selectinload(models.WorkoutDay.exercises).selectinload(models.WorkoutDayExercise.exercise))
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def edit_workout_day(db: AsyncSession, workout_day_id: int, operations: List[schemas.WorkoutDayEditOperation]) -> Optional[models.WorkoutDay]:
+    """
+    Applies an ordered list of edit operations to a day in one transaction.
+    The operations are folded in memory first, then written with at most one bulk
+    DELETE, UPDATE and INSERT each. Returns the resulting day, or None when the day
+    does not exist. Raises ValueError, without writing anything, when an operation
+    refers to an entry outside the day or to an unknown exercise.
+    """
+    day_exercise = models.WorkoutDayExercise
+    try:
+        owner_id = await get_workout_day_owner(db, workout_day_id)
+        if owner_id is None:
+            return None
+
+        result = await db.execute(
+            select(day_exercise.id, day_exercise.exercise_id, day_exercise.sets, day_exercise.reps)
+            .filter(day_exercise.workout_day_id == workout_day_id)
+        )
+        current = {row.id: {"id": row.id, "exercise_id": row.exercise_id, "sets": row.sets, "reps": row.reps} for row in result.all()}
+
+        rows = {entry_id: dict(row) for entry_id, row in current.items()}
+        additions = []
+        for index, operation in enumerate(operations):
+            if operation.op == "add":
+                additions.append({"workout_day_id": workout_day_id, "exercise_id": operation.exercise_id, "sets": operation.sets, "reps": operation.reps})
+                continue
+            row = rows.get(operation.day_exercise_id)
+            if row is None:
+                raise ValueError(f"Operation {index}: exercise entry {operation.day_exercise_id} is not part of this workout day")
+            if operation.op == "remove":
+                del rows[operation.day_exercise_id]
+            elif operation.op == "update":
+                row["sets"], row["reps"] = operation.sets, operation.reps
+            elif operation.op == "replace":
+                row["exercise_id"] = operation.exercise_id
+
+        exercise_ids = {row["exercise_id"] for row in rows.values()} | {row["exercise_id"] for row in additions}
+        if exercise_ids:
+            result = await db.execute(select(models.Exercise.id).filter(models.Exercise.id.in_(exercise_ids)))
+            unknown = exercise_ids - set(result.scalars().all())
+            if unknown:
+                raise ValueError(f"Unknown exercise ids: {sorted(unknown)}")
+
+        removed = [entry_id for entry_id in current if entry_id not in rows]
+        changed = [row for entry_id, row in rows.items() if row != current[entry_id]]
+        if removed:
+            await db.execute(delete(day_exercise).where(day_exercise.id.in_(removed)))
+        if changed:
+            await db.execute(update(day_exercise), changed)
+        if additions:
+            await db.execute(insert(day_exercise), additions)
+
+        workout_day = await get_workout_day(db, workout_day_id)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    await _plan_changed(owner_id)
+    return workout_day
 
 async def update_workout_day_exercise(db: AsyncSession, day_exercise_id: int, exercise_update: schemas.WorkoutDayExerciseUpdate):
     result = await db.execute(select(models.WorkoutDayExercise).filter(models.WorkoutDayExercise.id == day_exercise_id))
@@ -107,7 +239,9 @@ async def update_workout_day_exercise(db: AsyncSession, day_exercise_id: int, ex
         db_exercise.sets = exercise_update.sets
         db_exercise.reps = exercise_update.reps
         await db.commit()
-        await db.refresh(db_exercise)
+        await _invalidate_plan_of_day(db, db_exercise.workout_day_id)
+        # The response includes the library entry, which cannot be lazy-loaded later
+        await db.refresh(db_exercise, ["exercise"])
     return db_exercise
 
 async def delete_workout_day_exercise(db: AsyncSession, day_exercise_id: int) -> bool:
@@ -116,6 +250,7 @@ async def delete_workout_day_exercise(db: AsyncSession, day_exercise_id: int) ->
     if db_exercise:
         await db.delete(db_exercise)
         await db.commit()
+        await _invalidate_plan_of_day(db, db_exercise.workout_day_id)
         return True
     return False
 
@@ -125,25 +260,198 @@ async def update_exercise_in_plan(db: AsyncSession, day_exercise_id: int, new_ex
     if db_day_exercise:
         db_day_exercise.exercise_id = new_exercise_id
         await db.commit()
-        await db.refresh(db_day_exercise)
+        await _invalidate_plan_of_day(db, db_day_exercise.workout_day_id)
+        # The response includes the library entry, which cannot be lazy-loaded later
+        await db.refresh(db_day_exercise, ["exercise"])
     return db_day_exercise
 
 # --- Session Log CRUD ---
 
+async def _logs_changed(user_id: int, log_dates):
+    """Called after a user's logs commit: drops the affected cached weeks and pins their reads to the primary."""
+    for week_start in {log_date - timedelta(days=log_date.weekday()) for log_date in log_dates}:
+        cache.volume_cache.invalidate(user_id, week_start)
+    await database.note_user_write(user_id)
+
+def _insert_ignoring_duplicates(db: AsyncSession, model):
+    """INSERT that skips rows which would violate a unique index instead of failing."""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    return insert(model)
+
 async def create_workout_session_log(db: AsyncSession, log_data: schemas.WorkoutSessionLogCreate) -> models.WorkoutSessionLog:
-    db_log = models.WorkoutSessionLog(**log_data.model_dump())
-    db.add(db_log)
-    await db.commit()
-    await db.refresh(db_log)
-    return db_log
+    """Logs one set. A set that was already logged is returned as stored rather than inserted again."""
+    created, duplicates = await create_workout_session_logs_batch(db, [log_data])
+    return (created or duplicates)[0]
+
+async def create_workout_session_logs_batch(
+    db: AsyncSession, logs_data: List[schemas.WorkoutSessionLogCreate]
+) -> Tuple[List[models.WorkoutSessionLog], List[models.WorkoutSessionLog]]:
+    """
+    Inserts a batch of logged sets with one multi-row insert in one transaction.
+    A set is identified by (user_id, exercise_id, date, set number), which a unique
+    index enforces; sets that were already logged, e.g. by a retried submission, even
+    one running concurrently, are skipped by the insert instead of being stored twice.
+    Returns the (created, duplicate) rows.
+    """
+    log = models.WorkoutSessionLog
+
+    def set_key(row):
+        return (row.user_id, row.exercise_id, row.date, row.sets)
+
+    await partitions.ensure_for_dates({log_data.date for log_data in logs_data})
+    new_rows = {}
+    for log_data in logs_data:
+        new_rows.setdefault(set_key(log_data), log_data.model_dump())
+
+    try:
+        result = await db.scalars(_insert_ignoring_duplicates(db, log).returning(log), list(new_rows.values()))
+        created = result.all()
+        rows_by_key = {set_key(row): row for row in created}
+        for user_id, exercise_id, log_date in sorted({key[:3] for key in rows_by_key}):
+            await refresh_exercise_progress(db, user_id, exercise_id, log_date)
+
+        # Every set that was not inserted here, or repeats one that was, is a duplicate
+        duplicate_keys = []
+        inserted_keys = set()
+        for log_data in logs_data:
+            key = set_key(log_data)
+            if key in rows_by_key and key not in inserted_keys:
+                inserted_keys.add(key)
+            else:
+                duplicate_keys.append(key)
+        missing = set(duplicate_keys) - rows_by_key.keys()
+        if missing:
+            result = await db.execute(select(log).filter(tuple_(log.user_id, log.exercise_id, log.date, log.sets).in_(missing)))
+            rows_by_key.update((set_key(row), row) for row in result.scalars().all())
+        duplicates = [rows_by_key[key] for key in duplicate_keys]
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    for user_id in {row.user_id for row in created}:
+        await _logs_changed(user_id, {row.date for row in created if row.user_id == user_id})
+    notes_search.notes_indexes.add_logs(created)
+    return created, duplicates
+
+def _repeated_set_filter():
+    """Matches every log that repeats the first-stored copy of its set."""
+    log = models.WorkoutSessionLog
+    first_ids = select(func.min(log.id)).group_by(log.user_id, log.exercise_id, log.date, log.sets)
+    return log.id.not_in(first_ids)
+
+async def count_duplicate_session_logs(db: AsyncSession) -> int:
+    result = await db.execute(select(func.count()).select_from(models.WorkoutSessionLog).filter(_repeated_set_filter()))
+    return result.scalar_one()
+
+async def get_duplicate_session_logs(db: AsyncSession) -> List[models.WorkoutSessionLog]:
+    """
+    Logs stored for a set that was already logged (same user, exercise, date and set
+    number), possible only on databases created before the unique set index existed.
+    The first copy of each set is not included.
+    """
+    log = models.WorkoutSessionLog
+    result = await db.execute(
+        select(log).filter(_repeated_set_filter()).order_by(log.user_id, log.exercise_id, log.date, log.sets, log.id)
+    )
+    return result.scalars().all()
+
+async def delete_duplicate_session_logs(db: AsyncSession) -> List[models.WorkoutSessionLog]:
+    """Deletes the logs returned by get_duplicate_session_logs() and returns them."""
+    log = models.WorkoutSessionLog
+    try:
+        duplicates = await get_duplicate_session_logs(db)
+        if not duplicates:
+            return []
+        await db.execute(
+            delete(log).where(log.id.in_([row.id for row in duplicates])).execution_options(synchronize_session=False)
+        )
+        for user_id, exercise_id, log_date in sorted({(row.user_id, row.exercise_id, row.date) for row in duplicates}):
+            await refresh_exercise_progress(db, user_id, exercise_id, log_date)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    for user_id in {row.user_id for row in duplicates}:
+        await _logs_changed(user_id, {row.date for row in duplicates if row.user_id == user_id})
+    return duplicates
 
 async def get_session_logs_by_date(db: AsyncSession, user_id: int, log_date: date) -> List[models.WorkoutSessionLog]:
+    if log_archive.archive.is_archived(log_date):
+        return log_archive.archive.read(user_id, log_date, log_date)
     result = await db.execute(
         select(models.WorkoutSessionLog)
         .filter(models.WorkoutSessionLog.user_id == user_id, models.WorkoutSessionLog.date == log_date)
     )
     return result.scalars().all()
 
+async def get_session_logs_in_range(
+    db: AsyncSession,
+    user_id: int,
+    from_date: date,
+    to_date: date,
+    limit: int,
+    after: Optional[Tuple[date, int]] = None,
+) -> List[models.WorkoutSessionLog]:
+    """
+    Returns up to `limit` logs of a user between two dates (inclusive), ordered by
+    (date, id). Pass the (date, id) of the last row seen as `after` to fetch the next page.
+    Dates before the archive boundary are read from the log archive.
+    """
+    archived = []
+    archived_before = log_archive.archive.archived_before()
+    if archived_before is not None and from_date < archived_before:
+        archived = [
+            log for log in log_archive.archive.read(user_id, from_date, min(to_date, archived_before - timedelta(days=1)))
+            if after is None or (log.date, log.id) > after
+        ][:limit]
+        if len(archived) == limit or to_date < archived_before:
+            return archived
+        from_date, limit = archived_before, limit - len(archived)
+
+    query = (
+        select(models.WorkoutSessionLog)
+        .filter(
+            models.WorkoutSessionLog.user_id == user_id,
+            models.WorkoutSessionLog.date >= from_date,
+            models.WorkoutSessionLog.date <= to_date,
+        )
+        .order_by(models.WorkoutSessionLog.date, models.WorkoutSessionLog.id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.filter(tuple_(models.WorkoutSessionLog.date, models.WorkoutSessionLog.id) > tuple_(*after))
+    result = await db.execute(query)
+    return archived + result.scalars().all()
+
+async def stream_session_log_history(db: AsyncSession, user_id: int, chunk_size: int = 1000) -> AsyncIterator[list]:
+    """
+    Streams a user's complete log history, joined with the exercise name, in chunks of rows.
+    Rows come from a server-side cursor as plain tuples, so memory use does not grow with
+    the length of the history. Archived months are not included; see log_export.
+    """
+    result = await db.stream(
+        select(
+            models.WorkoutSessionLog.id,
+            models.WorkoutSessionLog.date,
+            models.WorkoutSessionLog.exercise_id,
+            models.Exercise.name.label("exercise_name"),
+            models.WorkoutSessionLog.sets,
+            models.WorkoutSessionLog.reps,
+            models.WorkoutSessionLog.weight_kg,
+            models.WorkoutSessionLog.notes,
+        )
+        .join(models.Exercise, models.WorkoutSessionLog.exercise_id == models.Exercise.id)
+        .filter(models.WorkoutSessionLog.user_id == user_id)
+        .order_by(models.WorkoutSessionLog.date, models.WorkoutSessionLog.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions():
+        yield partition
+
 async def delete_session_log(db: AsyncSession, log_id: int, user_id: int) -> bool:
     result = await db.execute(
         select(models.WorkoutSessionLog)
@@ -152,59 +460,375 @@ async def delete_session_log(db: AsyncSession, log_id: int, user_id: int) -> boo
     log_to_delete = result.scalars().first()
     if log_to_delete:
         await db.delete(log_to_delete)
+        await db.flush()
+        await refresh_exercise_progress(db, log_to_delete.user_id, log_to_delete.exercise_id, log_to_delete.date)
         await db.commit()
+        await _logs_changed(user_id, [log_to_delete.date])
+        notes_search.notes_indexes.remove_log(user_id, log_id)
         return True
     return False
 
+async def search_session_log_notes(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Tuple[models.WorkoutSessionLog, float]]:
+    """
+    Ranks a user's logs by how well their notes match `query`, best first.
+    Postgres answers from the GIN-indexed tsvector; other databases from the
+    in-process BM25 index in notes_search.
+    """
+    log = models.WorkoutSessionLog
+    if db.bind.dialect.name == "postgresql":
+        vector = models.notes_tsvector(log.notes)
+        ts_query = func.websearch_to_tsquery(literal_column("'english'"), query)
+        rank = func.ts_rank_cd(vector, ts_query)
+        statement = select(log, rank).filter(log.user_id == user_id, vector.op("@@")(ts_query))
+        if from_date is not None:
+            statement = statement.filter(log.date >= from_date)
+        if to_date is not None:
+            statement = statement.filter(log.date <= to_date)
+        result = await db.execute(statement.order_by(rank.desc(), log.id.desc()).limit(limit).offset(offset))
+        return [(row[0], row[1]) for row in result.all()]
+
+    async def fetch_notes():
+        result = await db.execute(select(log.id, log.date, log.notes).filter(log.user_id == user_id, log.notes.isnot(None)))
+        return result.all()
+
+    index = await notes_search.notes_indexes.load(user_id, fetch_notes)
+    ranked = index.search(query, from_date, to_date)[offset:offset + limit]
+    if not ranked:
+        return []
+    result = await db.execute(select(log).filter(log.id.in_([log_id for log_id, _ in ranked])))
+    logs = {row.id: row for row in result.scalars().all()}
+    return [(logs[log_id], score) for log_id, score in ranked if log_id in logs]
+
+# --- Progress Rollup CRUD ---
+
+def _progress_rollup_insert(*filters):
+    """INSERT ... SELECT that aggregates the matching logs into daily rollup rows."""
+    log = models.WorkoutSessionLog
+    aggregate = (
+        select(
+            log.user_id,
+            log.exercise_id,
+            log.date,
+            func.count(log.id),
+            func.sum(log.reps),
+            func.sum(log.reps * log.weight_kg),
+            func.max(log.weight_kg),
+            func.max(log.weight_kg * (1 + log.reps / 30.0)),
+        )
+        .filter(*filters)
+        .group_by(log.user_id, log.exercise_id, log.date)
+    )
+    return insert(models.ExerciseProgressRollup).from_select(
+        ["user_id", "exercise_id", "date", "set_count", "total_reps", "volume_kg", "top_weight_kg", "estimated_1rm_kg"],
+        aggregate,
+    )
 
-async def get_template_count(db: AsyncSession) -> int:
-    result = await db.execute(select(func.count(models.WorkoutTemplate.id)))
-    return result.scalar_one()
+async def refresh_exercise_progress(db: AsyncSession, user_id: int, exercise_id: int, log_date: date):
+    """
+    Recomputes the rollup of a single user/exercise/day from that day's logs.
+    Runs inside the caller's transaction; the caller commits. Callers refreshing several
+    days do so in sorted order, so their locks cannot deadlock.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # Concurrent refreshes of the same day would each aggregate without the other's
+        # uncommitted logs, or collide on the rollup's primary key. The lock is held until
+        # commit, so the second one aggregates after the first has committed its logs.
+        await db.execute(
+            text("SELECT pg_advisory_xact_lock(:user_id, hashtext(:day))"),
+            {"user_id": user_id, "day": f"exercise_progress:{exercise_id}:{log_date.isoformat()}"},
+        )
+    rollup = models.ExerciseProgressRollup
+    await db.execute(
+        delete(rollup).where(rollup.user_id == user_id, rollup.exercise_id == exercise_id, rollup.date == log_date)
+    )
+    log = models.WorkoutSessionLog
+    await db.execute(_progress_rollup_insert(log.user_id == user_id, log.exercise_id == exercise_id, log.date == log_date))
+
+async def rebuild_exercise_progress(db: AsyncSession, user_id: Optional[int] = None):
+    """
+    Regenerates the rollups of one user, or of every user, from the raw logs.
+    Rollups of archived months are kept, since their logs are no longer in the database.
+    """
+    rollup = models.ExerciseProgressRollup
+    log = models.WorkoutSessionLog
+    rollup_filters, log_filters = [], []
+    if user_id is not None:
+        rollup_filters.append(rollup.user_id == user_id)
+        log_filters.append(log.user_id == user_id)
+    archived_before = log_archive.archive.archived_before()
+    if archived_before is not None:
+        rollup_filters.append(rollup.date >= archived_before)
+        log_filters.append(log.date >= archived_before)
+    try:
+        await db.execute(delete(rollup).where(*rollup_filters))
+        await db.execute(_progress_rollup_insert(*log_filters))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    cache.volume_cache.invalidate_user(user_id)
+
+async def get_exercise_progress(
+    db: AsyncSession,
+    user_id: int,
+    exercise_id: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+) -> List[models.ExerciseProgressRollup]:
+    """Reads a user's daily rollups, ordered by exercise and date."""
+    rollup = models.ExerciseProgressRollup
+    query = select(rollup).filter(rollup.user_id == user_id).order_by(rollup.exercise_id, rollup.date)
+    if exercise_id is not None:
+        query = query.filter(rollup.exercise_id == exercise_id)
+    if from_date is not None:
+        query = query.filter(rollup.date >= from_date)
+    if to_date is not None:
+        query = query.filter(rollup.date <= to_date)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def get_muscle_group_daily_volume(db: AsyncSession, user_id: int, from_date: date, to_date: date) -> list:
+    """
+    Sums a user's daily rollups per day and muscle group in one grouped query.
+    Returns (date, muscle_group_id, muscle_group, set_count, total_reps, volume_kg) rows.
+    """
+    rollup = models.ExerciseProgressRollup
+    result = await db.execute(
+        select(
+            rollup.date,
+            models.MuscleGroup.id,
+            models.MuscleGroup.name,
+            func.sum(rollup.set_count),
+            func.sum(rollup.total_reps),
+            func.sum(rollup.volume_kg),
+        )
+        .join(models.Exercise, models.Exercise.id == rollup.exercise_id)
+        .join(models.MuscleGroup, models.MuscleGroup.id == models.Exercise.muscle_group_id)
+        .filter(rollup.user_id == user_id, rollup.date >= from_date, rollup.date <= to_date)
+        .group_by(rollup.date, models.MuscleGroup.id, models.MuscleGroup.name)
+    )
+    return result.all()
+
+# --- Exercise Recommendation CRUD ---
+
+async def stream_recent_log_columns(db: AsyncSession, since: date, chunk_size: int = 100_000) -> AsyncIterator[list]:
+    """
+    Streams (user_id, exercise_id, date, reps, weight_kg) of every user's logs since
+    `since` from a server-side cursor, in chunks of plain row tuples.
+    """
+    log = models.WorkoutSessionLog
+    result = await db.stream(
+        select(log.user_id, log.exercise_id, log.date, log.reps, log.weight_kg)
+        .filter(log.date >= since)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions():
+        yield partition
+
+async def get_planned_exercise_targets(db: AsyncSession) -> list:
+    """Returns the distinct (user_id, exercise_id, reps) targets across every user's plan."""
+    result = await db.execute(
+        select(models.WorkoutDay.user_id, models.WorkoutDayExercise.exercise_id, models.WorkoutDayExercise.reps)
+        .join(models.WorkoutDayExercise, models.WorkoutDayExercise.workout_day_id == models.WorkoutDay.id)
+        .distinct()
+    )
+    return result.all()
+
+async def replace_exercise_recommendations(db: AsyncSession, recommendations: List[dict], batch_size: int = 10_000):
+    """Swaps the whole recommendation table for a freshly computed one in a single transaction."""
+    try:
+        await db.execute(delete(models.ExerciseRecommendation))
+        for offset in range(0, len(recommendations), batch_size):
+            await db.execute(insert(models.ExerciseRecommendation), recommendations[offset:offset + batch_size])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
 
-async def get_all_exercises_dict(db: AsyncSession) -> dict:
-    exercises = await get_all_exercises(db)
-    return {ex.name: ex for ex in exercises}
+async def get_exercise_recommendations(db: AsyncSession, user_id: int) -> List[models.ExerciseRecommendation]:
+    result = await db.execute(
+        select(models.ExerciseRecommendation).filter(models.ExerciseRecommendation.user_id == user_id)
+    )
+    return result.scalars().all()
 
-async def create_workout_template(db: AsyncSession, name: str) -> models.WorkoutTemplate:
-    template = models.WorkoutTemplate(name=name)
-    db.add(template)
+# --- Plan Generation Job CRUD ---
+
+async def create_plan_generation_job(db: AsyncSession, job_id: str, user_id: int, created_at: datetime):
+    db.add(models.PlanGenerationJob(id=job_id, user_id=user_id, status="pending", created_at=created_at))
+    await db.commit()
+
+async def update_plan_generation_job(db: AsyncSession, job_id: str, **fields):
+    await db.execute(update(models.PlanGenerationJob).where(models.PlanGenerationJob.id == job_id).values(**fields))
     await db.commit()
-    await db.refresh(template)
-    return template
 
-async def add_exercise_to_template(db: AsyncSession, template_id: int, exercise_id: int):
-    template_ex = models.WorkoutTemplateExercise(template_id=template_id, exercise_id=exercise_id)
-    db.add(template_ex)
+async def get_plan_generation_job(db: AsyncSession, job_id: str) -> Optional[models.PlanGenerationJob]:
+    result = await db.execute(select(models.PlanGenerationJob).filter(models.PlanGenerationJob.id == job_id))
+    return result.scalars().first()
+
+async def delete_finished_plan_generation_jobs(db: AsyncSession, finished_before: datetime) -> int:
+    job = models.PlanGenerationJob
+    result = await db.execute(delete(job).where(job.finished_at < finished_before))
     await db.commit()
+    return result.rowcount
+
+# --- Catalog (Exercise Library & Templates) CRUD ---
+
+async def get_catalog_version(db: AsyncSession) -> Optional[int]:
+    result = await db.execute(select(models.CatalogVersion.version))
+    return result.scalars().first()
+
+async def apply_catalog(db: AsyncSession, catalog: dict) -> Dict[str, int]:
+    """
+    Brings muscle groups, exercises and templates in line with a catalog in a single
+    transaction and records its version. Only the difference against the database is
+    written, with bulk statements. Rows missing from the catalog are kept because plans
+    and logs may still reference them; template contents are replaced to match.
+    Returns the number of rows written per kind.
+    """
+    try:
+        result = await db.execute(select(models.MuscleGroup.name, models.MuscleGroup.id))
+        group_ids = dict(result.all())
+        new_groups = [{"name": name} for name in catalog["muscle_groups"] if name not in group_ids]
+        if new_groups:
+            result = await db.execute(
+                insert(models.MuscleGroup).returning(models.MuscleGroup.name, models.MuscleGroup.id), new_groups
+            )
+            group_ids.update(result.all())
+
+        result = await db.execute(select(models.Exercise.name, models.Exercise.id, models.Exercise.type, models.Exercise.muscle_group_id))
+        existing_exercises = {name: (exercise_id, type, muscle_group_id) for name, exercise_id, type, muscle_group_id in result.all()}
+        new_exercises, changed_exercises = [], []
+        for exercise in catalog["exercises"]:
+            row = {"name": exercise["name"], "type": exercise["type"], "muscle_group_id": group_ids[exercise["group"]]}
+            current = existing_exercises.get(exercise["name"])
+            if current is None:
+                new_exercises.append(row)
+            elif current[1:] != (row["type"], row["muscle_group_id"]):
+                changed_exercises.append({"id": current[0], "type": row["type"], "muscle_group_id": row["muscle_group_id"]})
+        exercise_ids = {name: values[0] for name, values in existing_exercises.items()}
+        if new_exercises:
+            result = await db.execute(
+                insert(models.Exercise).returning(models.Exercise.name, models.Exercise.id), new_exercises
+            )
+            exercise_ids.update(result.all())
+        if changed_exercises:
+            await db.execute(update(models.Exercise), changed_exercises)
+
+        result = await db.execute(select(models.WorkoutTemplate.name, models.WorkoutTemplate.id))
+        template_ids = dict(result.all())
+        new_templates = [{"name": name} for name in catalog["templates"] if name not in template_ids]
+        if new_templates:
+            result = await db.execute(
+                insert(models.WorkoutTemplate).returning(models.WorkoutTemplate.name, models.WorkoutTemplate.id), new_templates
+            )
+            template_ids.update(result.all())
+
+        result = await db.execute(select(
+            models.WorkoutTemplateExercise.id,
+            models.WorkoutTemplateExercise.template_id,
+            models.WorkoutTemplateExercise.exercise_id,
+        ))
+        existing_links = {(template_id, exercise_id): link_id for link_id, template_id, exercise_id in result.all()}
+        wanted_links = [
+            (template_ids[template_name], exercise_ids[exercise_name])
+            for template_name, exercise_names in catalog["templates"].items()
+            for exercise_name in exercise_names
+        ]
+        wanted_links = list(dict.fromkeys(wanted_links))
+        wanted_link_set = set(wanted_links)
+        catalog_template_ids = {template_ids[name] for name in catalog["templates"]}
+        stale_links = [
+            link_id for (template_id, exercise_id), link_id in existing_links.items()
+            if template_id in catalog_template_ids and (template_id, exercise_id) not in wanted_link_set
+        ]
+        new_links = [
+            {"template_id": template_id, "exercise_id": exercise_id}
+            for template_id, exercise_id in wanted_links
+            if (template_id, exercise_id) not in existing_links
+        ]
+        if stale_links:
+            await db.execute(delete(models.WorkoutTemplateExercise).where(models.WorkoutTemplateExercise.id.in_(stale_links)))
+        if new_links:
+            await db.execute(insert(models.WorkoutTemplateExercise), new_links)
+
+        await db.execute(delete(models.CatalogVersion))
+        await db.execute(insert(models.CatalogVersion).values(id=1, version=catalog["version"]))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    cache.library_cache.invalidate()
+    return {
+        "muscle_groups": len(new_groups),
+        "exercises": len(new_exercises) + len(changed_exercises),
+        "templates": len(new_templates),
+        "template_exercises": len(new_links) + len(stale_links),
+    }
 
 async def get_all_templates(db: AsyncSession) -> List[models.WorkoutTemplate]:
     result = await db.execute(select(models.WorkoutTemplate))
     return result.scalars().all()
 
-async def swap_workout_day_with_template(db: AsyncSession, workout_day_id: int, template_id: int, sets: int, reps: str):
-    # 1. Delete old exercises for the day
-    await db.execute(delete(models.WorkoutDayExercise).where(models.WorkoutDayExercise.workout_day_id == workout_day_id))
-    
-    # 2. Get new exercises from the template
-    result = await db.execute(
-        select(models.WorkoutTemplateExercise)
-        .filter(models.WorkoutTemplateExercise.template_id == template_id)
-    )
-    template_exercises = result.scalars().all()
-
-    # 3. Add new exercises to the workout day
-    new_exercises = []
-    for temp_ex in template_exercises:
-        new_day_ex = models.WorkoutDayExercise(
-            workout_day_id=workout_day_id,
-            exercise_id=temp_ex.exercise_id,
-            sets=sets,
-            reps=reps
+async def swap_workout_day_with_template(
+    db: AsyncSession, workout_day_id: int, template_id: int, sets: int, reps: str, user_id: Optional[int] = None
+) -> Optional[List[models.WorkoutDayExercise]]:
+    """
+    Replaces a day's exercises with a template's in one transaction and a constant
+    number of queries, using INSERT ... SELECT from workout_template_exercises.
+    Returns the new rows with their exercise loaded, or None when the day (owned by
+    `user_id`, if given) or the template does not exist.
+    """
+    day_exercise = models.WorkoutDayExercise
+    template_exercise = models.WorkoutTemplateExercise
+    try:
+        # 1. Check that both the day and the template exist
+        result = await db.execute(select(
+            select(models.WorkoutDay.user_id).where(models.WorkoutDay.id == workout_day_id).scalar_subquery(),
+            select(models.WorkoutTemplate.id).where(models.WorkoutTemplate.id == template_id).scalar_subquery(),
+        ))
+        owner_id, found_template_id = result.one()
+        if owner_id is None or found_template_id is None or (user_id is not None and owner_id != user_id):
+            return None
+
+        # 2. Delete old exercises for the day
+        await db.execute(delete(day_exercise).where(day_exercise.workout_day_id == workout_day_id))
+
+        # 3. Copy the template's exercises into the day
+        await db.execute(
+            insert(day_exercise).from_select(
+                ["workout_day_id", "exercise_id", "sets", "reps"],
+                select(
+                    literal(workout_day_id, Integer),
+                    template_exercise.exercise_id,
+                    literal(sets, Integer),
+                    literal(reps, String),
+                )
+                .where(template_exercise.template_id == template_id)
+                .order_by(template_exercise.id),
+            )
         )
-        db.add(new_day_ex)
-        new_exercises.append(new_day_ex)
-    
-    await db.commit()
+
+        # 4. Read the new rows back already joined to their exercise
+        result = await db.execute(
+            select(day_exercise)
+            .options(joinedload(day_exercise.exercise))
+            .where(day_exercise.workout_day_id == workout_day_id)
+            .order_by(day_exercise.id)
+        )
+        new_exercises = result.scalars().all()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    await _plan_changed(owner_id)
     return new_exercises
 
 async def get_exercises_by_muscle_group_ids(db: AsyncSession, muscle_group_ids: List[int]) -> List[models.Exercise]:
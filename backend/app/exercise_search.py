@@ -0,0 +1,136 @@
+"""
+In-memory search index over the exercise library.
+
+Name prefixes are looked up by bisecting a sorted token list (a flattened trie) and
+typos are tolerated through a trigram index, as pg_trgm does. The index is rebuilt
+lazily on the first search after the library cache has been invalidated, so any
+catalog write is picked up without extra wiring.
+"""
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import cache, crud
+
+# Minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class IndexedExercise(NamedTuple):
+    id: int
+    name: str
+    type: str
+    muscle_group_id: int
+    muscle_group: str
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _trigrams(tokens: List[str]) -> Set[str]:
+    grams = set()
+    for token in tokens:
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ExerciseSearchIndex:
+    def __init__(self, exercises: List[IndexedExercise], generation: int = 0):
+        self.generation = generation
+        self.exercises: Dict[int, IndexedExercise] = {exercise.id: exercise for exercise in exercises}
+        self._names = {exercise.id: exercise.name.lower() for exercise in exercises}
+        self._tokens = sorted((token, exercise.id) for exercise in exercises for token in set(_tokenize(exercise.name)))
+        self._exercise_trigrams = {exercise.id: _trigrams(_tokenize(exercise.name)) for exercise in exercises}
+        self._postings: Dict[str, List[int]] = {}
+        for exercise_id, grams in self._exercise_trigrams.items():
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(exercise_id)
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        matches = set()
+        for token, exercise_id in self._tokens[bisect_left(self._tokens, (prefix,)):]:
+            if not token.startswith(prefix):
+                break
+            matches.add(exercise_id)
+        return matches
+
+    def _score(self, query: str, query_tokens: List[str]) -> Dict[int, float]:
+        """Ranks exercises: exact name, name prefix, all-words prefix, then fuzzy similarity."""
+        scores: Dict[int, float] = {}
+
+        prefix_sets = [self._prefix_matches(token) for token in query_tokens]
+        for exercise_id in set.intersection(*prefix_sets) if prefix_sets else set():
+            name = self._names[exercise_id]
+            scores[exercise_id] = 3.0 if name == query else 2.0 if name.startswith(query) else 1.0
+
+        query_grams = _trigrams(query_tokens)
+        shared = Counter(exercise_id for gram in query_grams for exercise_id in self._postings.get(gram, ()))
+        for exercise_id, count in shared.items():
+            similarity = count / (len(query_grams) + len(self._exercise_trigrams[exercise_id]) - count)
+            if similarity >= FUZZY_THRESHOLD:
+                scores[exercise_id] = scores.get(exercise_id, 0.0) + similarity
+        return scores
+
+    def search(
+        self,
+        query: str = "",
+        type: Optional[str] = None,
+        muscle_group_ids: Optional[List[int]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> dict:
+        """Returns a ranked page of matches plus type and muscle group facet counts."""
+        query = " ".join(_tokenize(query))
+        if query:
+            scores = self._score(query, query.split())
+        else:
+            scores = dict.fromkeys(self.exercises, 0.0)
+
+        # Facet counts describe all matches, before the facet filters narrow them down
+        facets = {
+            "types": dict(Counter(self.exercises[exercise_id].type for exercise_id in scores)),
+            "muscle_groups": dict(Counter(self.exercises[exercise_id].muscle_group_id for exercise_id in scores)),
+        }
+
+        group_filter = set(muscle_group_ids) if muscle_group_ids else None
+        matches = [
+            self.exercises[exercise_id] for exercise_id in scores
+            if (type is None or self.exercises[exercise_id].type.lower() == type.lower())
+            and (group_filter is None or self.exercises[exercise_id].muscle_group_id in group_filter)
+        ]
+        matches.sort(key=lambda exercise: (-scores[exercise.id], exercise.name))
+        return {
+            "total": len(matches),
+            "results": [
+                {**exercise._asdict(), "score": round(scores[exercise.id], 4)}
+                for exercise in matches[offset:offset + limit]
+            ],
+            "facets": facets,
+        }
+
+
+_index: Optional[ExerciseSearchIndex] = None
+
+
+async def get_index(db: AsyncSession) -> ExerciseSearchIndex:
+    """Returns the search index, rebuilding it if the exercise library changed since it was built."""
+    global _index
+    generation = cache.library_cache.generation
+    if _index is None or _index.generation != generation:
+        pool = await crud.get_exercise_pool_by_muscle_group(db)
+        _index = ExerciseSearchIndex(
+            [
+                IndexedExercise(exercise.id, exercise.name, exercise.type, exercise.muscle_group_id, group_name)
+                for group_name, exercises in pool.items()
+                for exercise in exercises
+            ],
+            generation=generation,
+        )
+    return _index
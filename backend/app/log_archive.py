@@ -0,0 +1,153 @@
+"""
+Cold storage for old session logs.
+
+partitions.py moves whole months of workout_session_logs out of the database into one
+compressed columnar file per month: a NumPy .npz archive holding one array per column,
+with rows sorted by (user_id, date, id) so a user's rows are found by binary search.
+Notes are stored Arrow-style, as one UTF-8 byte array plus row offsets and a null mask.
+
+Months are archived oldest first, so everything before `archived_before()` lives in
+these files and nothing before it is left in the database. crud reads dates before that
+boundary from here and later dates from the table. Archived months are read-only: new
+logs for them are refused, and archived rows cannot be deleted or searched by notes.
+Their progress rollups stay in the database, so progress and volume are unaffected.
+
+The directory (LOG_ARCHIVE_DIR) must be shared by every process serving the API and
+the one running the archival job.
+"""
+import os
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import models
+
+FILE_PATTERN = re.compile(r"^workout_session_logs-(\d{4})-(\d{2})\.npz$")
+
+# Decompressed months kept in memory for paging through the same range
+CACHED_MONTHS = 4
+
+# Archived row: (id, user_id, exercise_id, date, sets, reps, weight_kg, notes)
+ArchivedRow = Tuple[int, int, int, date, int, int, float, Optional[str]]
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+@lru_cache(maxsize=CACHED_MONTHS)
+def _load_month(path: str, modified_ns: int) -> Dict[str, np.ndarray]:
+    # The modification time is part of the key so a rewritten file is loaded afresh
+    with np.load(path) as columns:
+        return {name: columns[name] for name in columns.files}
+
+
+class LogArchive:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._listed_ns: Optional[int] = None
+        self._months: List[date] = []
+
+    def path(self, month: date) -> str:
+        return os.path.join(self.directory, f"workout_session_logs-{month:%Y-%m}.npz")
+
+    def months(self) -> List[date]:
+        """First days of the archived months, oldest first."""
+        # One stat() per call; the directory is listed again only after it changes
+        try:
+            modified_ns = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            self._listed_ns, self._months = None, []
+            return self._months
+        if modified_ns != self._listed_ns:
+            matches = (FILE_PATTERN.match(name) for name in os.listdir(self.directory))
+            self._months = sorted(date(int(match[1]), int(match[2]), 1) for match in matches if match)
+            self._listed_ns = modified_ns
+        return self._months
+
+    def archived_before(self) -> Optional[date]:
+        """First date still held by the database, or None when nothing is archived."""
+        months = self.months()
+        return _next_month(months[-1]) if months else None
+
+    def is_archived(self, day: date) -> bool:
+        boundary = self.archived_before()
+        return boundary is not None and day < boundary
+
+    def write_month(self, month: date, rows: Iterable[ArchivedRow]) -> int:
+        """
+        Writes one month, replacing any earlier file for it. Rows must be sorted by
+        (user_id, date, id). The file only appears, atomically, once fully written.
+        """
+        rows = list(rows)
+        ids, user_ids, exercise_ids, days, sets, reps, weights, notes = zip(*rows) if rows else ((),) * 8
+        encoded = [(note or "").encode() for note in notes]
+        columns = {
+            "id": np.array(ids, dtype=np.int64),
+            "user_id": np.array(user_ids, dtype=np.int64),
+            "exercise_id": np.array(exercise_ids, dtype=np.int64),
+            "date": np.array([day.toordinal() for day in days], dtype=np.int64),
+            "sets": np.array(sets, dtype=np.int32),
+            "reps": np.array(reps, dtype=np.int32),
+            "weight_kg": np.array(weights, dtype=np.float64),
+            "notes_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "notes_offsets": np.cumsum([0] + [len(note) for note in encoded], dtype=np.int64),
+            "notes_null": np.array([note is None for note in notes], dtype=bool),
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(month)
+        with open(path + ".tmp", "wb") as file:
+            np.savez_compressed(file, **columns)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+        return len(ids)
+
+    def iter_months(self, user_id: int, from_date: Optional[date] = None, to_date: Optional[date] = None) -> Iterator[List[models.WorkoutSessionLog]]:
+        """Yields a user's archived logs between two dates (inclusive) month by month, ordered by (date, id)."""
+        for month in self.months():
+            if (from_date and _next_month(month) <= from_date) or (to_date and month > to_date):
+                continue
+            logs = self._read_month(month, user_id, from_date, to_date)
+            if logs:
+                yield logs
+
+    def read(self, user_id: int, from_date: date, to_date: date) -> List[models.WorkoutSessionLog]:
+        return [log for logs in self.iter_months(user_id, from_date, to_date) for log in logs]
+
+    def _read_month(self, month: date, user_id: int, from_date: Optional[date], to_date: Optional[date]) -> List[models.WorkoutSessionLog]:
+        path = self.path(month)
+        try:
+            columns = _load_month(path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return []
+        start, end = np.searchsorted(columns["user_id"], [user_id, user_id + 1]).tolist()
+        # Within a user, rows are sorted by date, so the date range is a slice too
+        days = columns["date"][start:end]
+        if to_date is not None:
+            end = start + int(np.searchsorted(days, to_date.toordinal(), side="right"))
+        if from_date is not None:
+            start += int(np.searchsorted(days, from_date.toordinal()))
+
+        offsets, data = columns["notes_offsets"], columns["notes_data"]
+        return [
+            models.WorkoutSessionLog(
+                id=log_id, user_id=user_id, exercise_id=exercise_id, date=date.fromordinal(day),
+                sets=sets, reps=reps, weight_kg=weight,
+                notes=None if null else data[offsets[row]:offsets[row + 1]].tobytes().decode(),
+            )
+            for row, log_id, exercise_id, day, sets, reps, weight, null in zip(
+                range(start, end),
+                columns["id"][start:end].tolist(), columns["exercise_id"][start:end].tolist(),
+                columns["date"][start:end].tolist(), columns["sets"][start:end].tolist(),
+                columns["reps"][start:end].tolist(), columns["weight_kg"][start:end].tolist(),
+                columns["notes_null"][start:end].tolist(),
+            )
+        ]
+
+
+archive = LogArchive(os.getenv("LOG_ARCHIVE_DIR", "log-archive"))
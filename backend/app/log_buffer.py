@@ -0,0 +1,177 @@
+"""
+Write-behind buffer for single-set logging.
+
+With LOG_WRITE_MODE=buffered, POST /api/logs/session acknowledges a set as soon as it
+is in this buffer. A background task writes the buffered sets with one batch insert
+every LOG_FLUSH_INTERVAL_MS, or sooner once LOG_FLUSH_MAX_ROWS sets are waiting. The
+buffer is flushed on shutdown, but sets still buffered when the process dies are lost.
+That is the trade-off against the default strict mode, which commits every set before
+answering.
+
+Reads of a user's logs call sync() first, so a user always sees the sets they logged.
+
+A set that is already stored (same user, exercise, date and set number) is not stored
+again, exactly as in strict mode, where logging it again returns the stored set. Here
+the client has already been answered, so such sets are only counted, in
+log_buffer_duplicate_rows_total.
+"""
+import asyncio
+import os
+import time
+import traceback
+from collections import Counter
+from typing import List, Optional
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from . import crud, database, metrics, schemas
+
+# Attempts per batch before a flush gives up and leaves the sets buffered
+FLUSH_ATTEMPTS = 3
+
+
+class LogWriteBuffer:
+    def __init__(self, flush_interval_seconds: float = 0.05, max_batch_rows: int = 500, max_pending_rows: int = 10_000):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_batch_rows = max_batch_rows
+        # Past this many buffered sets, add() waits for a flush instead of growing the buffer
+        self.max_pending_rows = max_pending_rows
+        self._pending: List[schemas.WorkoutSessionLogCreate] = []
+        self._pending_users: Counter = Counter()
+        self._pending_done: Optional[asyncio.Future] = None
+        self._inflight_users: Counter = Counter()
+        self._inflight_done: Optional[asyncio.Future] = None
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background task and writes everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            traceback.print_exc()
+            print(f"Lost {len(self._pending)} buffered sets that could not be written on shutdown")
+
+    async def add(self, log_data: schemas.WorkoutSessionLogCreate):
+        if len(self._pending) >= self.max_pending_rows:
+            await self.flush()
+        if self._pending_done is None:
+            self._pending_done = asyncio.get_running_loop().create_future()
+        self._pending.append(log_data)
+        self._pending_users[log_data.user_id] += 1
+        metrics.LOG_BUFFER_DEPTH.set(len(self._pending))
+        if len(self._pending) >= self.max_batch_rows:
+            self._wake.set()
+
+    async def sync(self, user_id: int):
+        """Waits until every set buffered for the user so far has been written."""
+        if user_id in self._inflight_users:
+            await asyncio.shield(self._inflight_done)
+        if user_id in self._pending_users:
+            done = self._pending_done
+            self._wake.set()
+            await asyncio.shield(done)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            rows, done = self._pending, self._pending_done
+            self._inflight_users, self._inflight_done = self._pending_users, done
+            self._pending, self._pending_users, self._pending_done = [], Counter(), None
+            metrics.LOG_BUFFER_DEPTH.set(0)
+
+            start = time.perf_counter()
+            written = 0
+            try:
+                for written in range(0, len(rows), self.max_batch_rows):
+                    await self._write(rows[written:written + self.max_batch_rows])
+                written = len(rows)
+            finally:
+                metrics.LOG_BUFFER_FLUSH_SECONDS.observe(time.perf_counter() - start)
+                self._inflight_users, self._inflight_done = Counter(), None
+                if written == len(rows):
+                    done.set_result(None)
+                else:
+                    self._requeue(rows[written:], done)
+
+    def _requeue(self, rows: List[schemas.WorkoutSessionLogCreate], done: asyncio.Future):
+        """Puts sets that could not be written back at the front of the buffer."""
+        self._pending = rows + self._pending
+        self._pending_users.update(row.user_id for row in rows)
+        if self._pending_done is not None:
+            # Sets buffered meanwhile share the next flush with the requeued ones
+            self._pending_done.add_done_callback(lambda _: done.done() or done.set_result(None))
+        self._pending_done = self._pending_done or done
+        metrics.LOG_BUFFER_DEPTH.set(len(self._pending))
+
+    async def _write(self, rows: List[schemas.WorkoutSessionLogCreate]):
+        """
+        Writes one batch. Transient failures are retried and then re-raised, leaving the
+        sets buffered for the next flush. A batch rejected by the database is written
+        set by set so one bad set cannot hold back the others.
+        """
+        for attempt in range(FLUSH_ATTEMPTS):
+            try:
+                async with database.SessionLocal() as db:
+                    created, duplicates = await crud.create_workout_session_logs_batch(db, rows)
+                metrics.LOG_BUFFER_FLUSHED_ROWS.inc(len(created))
+                metrics.LOG_BUFFER_DUPLICATE_ROWS.inc(len(duplicates))
+                return
+            except (IntegrityError, DataError):
+                break
+            except Exception:
+                if attempt == FLUSH_ATTEMPTS - 1:
+                    raise
+                traceback.print_exc()
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+        if len(rows) > 1:
+            for row in rows:
+                await self._write([row])
+        else:
+            print(f"Dropping buffered set rejected by the database: {rows[0].model_dump_json()}")
+            metrics.LOG_BUFFER_DROPPED_ROWS.inc()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                traceback.print_exc()
+
+
+def _create_log_buffer() -> Optional[LogWriteBuffer]:
+    mode = os.getenv("LOG_WRITE_MODE", "strict").lower()
+    if mode == "strict":
+        return None
+    if mode != "buffered":
+        raise RuntimeError(f"LOG_WRITE_MODE must be 'strict' or 'buffered', not '{mode}'")
+    return LogWriteBuffer(
+        flush_interval_seconds=int(os.getenv("LOG_FLUSH_INTERVAL_MS", "50")) / 1000,
+        max_batch_rows=int(os.getenv("LOG_FLUSH_MAX_ROWS", "500")),
+        max_pending_rows=int(os.getenv("LOG_BUFFER_MAX_ROWS", "10000")),
+    )
+
+
+# None in strict mode, where every set is committed before the request returns
+log_buffer = _create_log_buffer()
+
+
+async def sync_user(user_id: int):
+    """Makes the user's buffered sets visible to the reads that follow; a no-op in strict mode."""
+    if log_buffer is not None:
+        await log_buffer.sync(user_id)
@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+from collections import namedtuple
+from typing import AsyncIterator
+
+from . import crud, database, log_archive
+
+# Column order of every exported row
+EXPORT_COLUMNS = ["id", "date", "exercise_id", "exercise_name", "sets", "reps", "weight_kg", "notes"]
+
+# Archived rows in the shape of the rows streamed from the database
+ExportRow = namedtuple("ExportRow", EXPORT_COLUMNS)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _format_ndjson(rows) -> str:
+    return "".join(
+        json.dumps({**row._asdict(), "date": row.date.isoformat()}) + "\n"
+        for row in rows
+    )
+
+
+def _format_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+async def export_session_logs(user_id: int, export_format: str) -> AsyncIterator[str]:
+    """
+    Yields a user's complete training history as NDJSON or CSV text chunks.
+    The generator owns its session because it keeps reading from the server-side
+    cursor after the endpoint has returned its StreamingResponse.
+    Archived months come first, one month at a time, then the logs still in the database.
+    """
+    formatter = _format_csv if export_format == "csv" else _format_ndjson
+    if export_format == "csv":
+        yield _format_csv([EXPORT_COLUMNS])
+
+    async with database.read_session(user_id) as db:
+        if log_archive.archive.months():
+            names = {exercise.id: exercise.name for exercise in await crud.get_all_exercises(db)}
+            for logs in log_archive.archive.iter_months(user_id):
+                yield formatter([
+                    ExportRow(log.id, log.date, log.exercise_id, names.get(log.exercise_id), log.sets, log.reps, log.weight_kg, log.notes)
+                    for log in logs
+                ])
+        async for rows in crud.stream_session_log_history(db, user_id):
+            yield formatter(rows)
@@ -1,13 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException
+import random
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from datetime import date
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from typing import List, Literal
+from datetime import date, timedelta
 from fastapi import Query
 
 # Import all necessary modules from our application
-from . import models, schemas, crud, database, workout_generator, seed
+from . import schemas, crud, database, workout_generator, bootstrap, log_export, progress, cache, metrics, serialization, exercise_search, plan_jobs, log_buffer, profiling, log_archive
 
 # Initialize the FastAPI app
 app = FastAPI()
@@ -27,16 +31,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling, not installed unless configured (see profiling.py). Added
+# before the metrics middleware so that it runs inside it and can read the request's SQL stats.
+if profiling.enabled():
+    app.middleware("http")(profiling.profiling_middleware)
+
+# Record per-route latency, query count and DB time for the /metrics endpoint
+metrics.instrument_engine(database.engine)
+if database.read_engine is not database.engine:
+    metrics.instrument_engine(database.read_engine, name="replica")
+app.middleware("http")(metrics.metrics_middleware)
+
+# Upper bound on the number of sets accepted by the batch logging endpoint
+MAX_LOG_BATCH_SIZE = 500
+# Upper bound on the page size of date-range log queries
+MAX_LOG_PAGE_SIZE = 2000
+# Upper bound on the number of weeks in one volume heatmap request
+MAX_VOLUME_WEEKS = 104
+
 # This event handler runs once when the application starts up
 @app.on_event("startup")
 async def on_startup():
-    # Create all database tables based on our models
-    async with database.engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
-    
-    # Seed the database with initial exercises and muscle groups
-    async with database.SessionLocal() as db:
-        await seed.seed_database(db)
+    # Create missing tables and seed, unless app.serve already did it before forking
+    if not bootstrap.database_prepared():
+        await bootstrap.prepare_database()
+    await bootstrap.warm_up()
+
+    await plan_jobs.plan_jobs.start()
+    if log_buffer.log_buffer is not None:
+        await log_buffer.log_buffer.start()
+    app.state.ready = True
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Stop receiving traffic from the load balancer while draining
+    app.state.ready = False
+    # Finish the plan generation jobs that were already accepted
+    await plan_jobs.plan_jobs.stop()
+    # Write out sets that were acknowledged but are still buffered
+    if log_buffer.log_buffer is not None:
+        await log_buffer.log_buffer.stop()
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """The process is up and its event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """Startup and warm-up have finished and the primary database answers."""
+    if not getattr(app.state, "ready", False):
+        return Response(content=b'{"status":"starting"}', status_code=503, media_type="application/json")
+    try:
+        async with database.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        return Response(content=b'{"status":"database unavailable"}', status_code=503, media_type="application/json")
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # --- User Management Endpoints ---
 
@@ -44,34 +99,185 @@ async def on_startup():
 async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_db)):
     try:
         db_user = await crud.create_user(db, user)
-        return db_user
+        return serialization.json_response(serialization.USER, db_user)
     except IntegrityError:
         raise HTTPException(status_code=400, detail="Username already exists")
 
 # --- Workout Plan Generation and Management Endpoints ---
 
-@app.post("/api/users/{user_id}/plan/", response_model=schemas.WorkoutPlan)
+@app.post("/api/users/{user_id}/plan/", response_model=schemas.WorkoutPlanJobResponse, status_code=202)
 async def create_workout_plan_and_generate(user_id: int, plan: schemas.WorkoutPlanCreate, db: AsyncSession = Depends(database.get_db)):
     db_plan = await crud.create_workout_plan(db, user_id, plan)
     if not db_plan:
         raise HTTPException(status_code=404, detail="Could not create workout plan for user.")
-    await workout_generator.generate_and_save_plan_for_user(db, user_id)
-    return db_plan
+    # The weekly schedule is generated in the background; poll the job for completion
+    try:
+        job = await plan_jobs.plan_jobs.enqueue(user_id)
+    except plan_jobs.QueueFullError:
+        raise HTTPException(status_code=503, detail="Plan generation is busy, please retry shortly", headers={"Retry-After": "5"})
+    return serialization.json_response(
+        serialization.WORKOUT_PLAN_JOB, {"plan_details": db_plan, "job": job},
+        status_code=202, headers={"Location": f"/api/plan-jobs/{job.id}"},
+    )
+
+@app.get("/api/plan-jobs/{job_id}", response_model=schemas.PlanGenerationJob)
+async def get_plan_generation_job(job_id: str):
+    job = await plan_jobs.plan_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Plan generation job not found")
+    return serialization.json_response(serialization.PLAN_GENERATION_JOB, job)
 
 @app.get("/api/users/{user_id}/plan/", response_model=schemas.WorkoutPlanResponse)
-async def get_user_plan(user_id: int, db: AsyncSession = Depends(database.get_db)):
-    plan_details = await crud.get_workout_plan_by_user(db, user_id)
-    if not plan_details:
-        raise HTTPException(status_code=404, detail="Workout plan details not found")
-    workout_days = await crud.get_workout_days_for_user(db, user_id)
-    weekly_schedule = {day.day_of_week: day for day in workout_days}
-    return { "plan_details": plan_details, "weekly_schedule": weekly_schedule }
+async def get_user_plan(user_id: int):
+    # Serve the pre-serialized document; crud invalidates it on every plan mutation
+    document = await cache.plan_cache.get(user_id)
+    if document is None:
+        version = cache.plan_cache.version(user_id)
+        # Built from the primary: a replica lagging behind the last invalidation would
+        # otherwise put a stale plan in the cache until it expires
+        async with database.SessionLocal() as db:
+            plan_details = await crud.get_workout_plan_by_user(db, user_id)
+            if not plan_details:
+                raise HTTPException(status_code=404, detail="Workout plan details not found")
+            workout_days = await crud.get_workout_days_for_user(db, user_id)
+            recommendations = {rec.exercise_id: rec for rec in await crud.get_exercise_recommendations(db, user_id)}
+        weekly_schedule = {day.day_of_week: day for day in workout_days}
+        document = serialization.to_json(serialization.WORKOUT_PLAN, {
+            "plan_details": plan_details, "weekly_schedule": weekly_schedule, "recommendations": recommendations,
+        })
+        await cache.plan_cache.set(user_id, document, version)
+    return Response(content=document, media_type="application/json")
+
+@app.post("/api/plan/preview", response_model=schemas.PlanPreviewResponse)
+async def preview_workout_plan(preview: schemas.PlanPreviewRequest, db: AsyncSession = Depends(database.get_read_db)):
+    # Dry run: samples a plan from the cached exercise pool without writing anything
+    seed = preview.seed if preview.seed is not None else random.getrandbits(32)
+    exercise_pool = await workout_generator.get_exercise_pool(db)
+    layout = workout_generator.get_plan_layout(preview.sessions_per_week, preview.goal)
+    weekly_plan = workout_generator.build_weekly_plan(exercise_pool, preview.sessions_per_week, preview.goal, random.Random(seed))
+    weekly_schedule = {
+        day_of_week: [
+            {"exercise_id": exercise.id, "sets": layout.sets, "reps": layout.reps, "exercise": exercise}
+            for exercise in exercises
+        ]
+        for day_of_week, exercises in weekly_plan
+    }
+    return serialization.json_response(serialization.PLAN_PREVIEW, {"seed": seed, "weekly_schedule": weekly_schedule})
 
 # --- Plan Customization and Logging Endpoints ---
 
+def ensure_not_archived(log_dates):
+    """Archived months are read-only; refuses logs that would land in one."""
+    archived_before = log_archive.archive.archived_before()
+    if archived_before is not None and min(log_dates) < archived_before:
+        raise HTTPException(status_code=409, detail=f"Logs before {archived_before.isoformat()} are archived and can no longer be changed")
+
 @app.get("/api/logs/session/{user_id}/{log_date}", response_model=List[schemas.WorkoutSessionLog])
-async def get_logs_for_date(user_id: int, log_date: date, db: AsyncSession = Depends(database.get_db)):
-    return await crud.get_session_logs_by_date(db, user_id=user_id, log_date=log_date)
+async def get_logs_for_date(user_id: int, log_date: date, db: AsyncSession = Depends(database.get_read_db)):
+    await log_buffer.sync_user(user_id)
+    logs = await crud.get_session_logs_by_date(db, user_id=user_id, log_date=log_date)
+    return serialization.json_response(serialization.SESSION_LOG_LIST, logs)
+
+@app.get("/api/logs/session/{user_id}", response_model=schemas.WorkoutSessionLogRangeResponse)
+async def get_logs_for_range(
+    user_id: int,
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    limit: int = Query(500, ge=1, le=MAX_LOG_PAGE_SIZE),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    """
+    Returns a user's logs between two dates (inclusive) grouped by date, in one round trip.
+    Long ranges are paginated with an opaque keyset cursor.
+    """
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    after = None
+    if cursor:
+        try:
+            cursor_date, cursor_id = cursor.split("_")
+            after = (date.fromisoformat(cursor_date), int(cursor_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    await log_buffer.sync_user(user_id)
+    # Fetch one extra row to find out whether another page follows
+    logs = await crud.get_session_logs_in_range(db, user_id, from_date, to_date, limit=limit + 1, after=after)
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = f"{logs[-1].date.isoformat()}_{logs[-1].id}"
+
+    days = {}
+    for log in logs:
+        days.setdefault(log.date, []).append(log)
+    return serialization.json_response(serialization.SESSION_LOG_RANGE, {"days": days, "next_cursor": next_cursor})
+
+@app.get("/api/users/{user_id}/logs/search", response_model=schemas.NotesSearchResponse)
+async def search_log_notes(
+    user_id: int,
+    q: str = Query(..., min_length=1),
+    from_date: date | None = Query(None, alias="from"),
+    to_date: date | None = Query(None, alias="to"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    """Full-text search over the notes of a user's logged sets, best match first."""
+    await log_buffer.sync_user(user_id)
+    # Fetch one extra hit to find out whether another page follows
+    hits = await crud.search_session_log_notes(db, user_id, q, from_date=from_date, to_date=to_date, limit=limit + 1, offset=offset)
+    return serialization.json_response(serialization.NOTES_SEARCH, {
+        "results": [{**serialization.SESSION_LOG.convert(log), "score": score} for log, score in hits[:limit]],
+        "next_offset": offset + limit if len(hits) > limit else None,
+    })
+
+@app.get("/api/users/{user_id}/logs/export")
+async def export_training_history(user_id: int, format: Literal["ndjson", "csv"] = "ndjson"):
+    """
+    Streams the user's full training history, with exercise names, as NDJSON or CSV.
+    Memory use stays constant regardless of how long the history is.
+    """
+    await log_buffer.sync_user(user_id)
+    return StreamingResponse(
+        log_export.export_session_logs(user_id, format),
+        media_type=log_export.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="training-history-{user_id}.{format}"'},
+    )
+
+@app.get("/api/users/{user_id}/progress", response_model=List[schemas.ExerciseProgressPoint])
+async def get_exercise_progress(
+    user_id: int,
+    exercise_id: int | None = None,
+    period: Literal["day", "week"] = "week",
+    from_date: date | None = Query(None, alias="from"),
+    to_date: date | None = Query(None, alias="to"),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    """
+    Volume, top set and estimated 1RM per exercise per day or week.
+    Served from the precomputed daily rollups, never from the raw logs.
+    """
+    await log_buffer.sync_user(user_id)
+    rollups = await crud.get_exercise_progress(db, user_id, exercise_id=exercise_id, from_date=from_date, to_date=to_date)
+    return serialization.json_response(serialization.PROGRESS_POINTS, progress.summarize_progress(rollups, period))
+
+@app.get("/api/users/{user_id}/volume", response_model=List[schemas.MuscleGroupVolumeWeek])
+async def get_weekly_muscle_group_volume(
+    user_id: int,
+    weeks: int = Query(12, ge=1, le=MAX_VOLUME_WEEKS),
+    to_date: date | None = Query(None, alias="to"),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    """
+    Training volume (reps x weight) per muscle group for each of the last `weeks`
+    weeks, ending with the week containing `to` (default: today). Weeks start on Monday.
+    """
+    await log_buffer.sync_user(user_id)
+    last_week = progress.week_start(to_date or date.today())
+    week_starts = [last_week - timedelta(weeks=offset) for offset in range(weeks - 1, -1, -1)]
+    return serialization.json_response(serialization.VOLUME_WEEKS, await progress.get_weekly_volume(db, user_id, week_starts))
 
 @app.delete("/api/logs/session/{log_id}", response_model=schemas.StatusResponse)
 async def delete_log(log_id: int, user_id: int, db: AsyncSession = Depends(database.get_db)):
@@ -80,23 +286,42 @@ async def delete_log(log_id: int, user_id: int, db: AsyncSession = Depends(datab
         raise HTTPException(status_code=404, detail="Log entry not found or user mismatch")
     return {"message": "Log entry deleted successfully"}
 
-@app.post("/api/logs/session", response_model=schemas.WorkoutSessionLog)
+@app.post(
+    "/api/logs/session",
+    response_model=schemas.WorkoutSessionLog,
+    responses={202: {"model": schemas.WorkoutSessionLogCreate, "description": "Accepted into the write-behind buffer"}},
+)
 async def log_workout_set(log_data: schemas.WorkoutSessionLogCreate, db: AsyncSession = Depends(database.get_db)):
-    return await crud.create_workout_session_log(db, log_data=log_data)
+    ensure_not_archived([log_data.date])
+    if log_buffer.log_buffer is not None:
+        # Throughput mode: acknowledge once buffered, the row is written with the next batch
+        await log_buffer.log_buffer.add(log_data)
+        return Response(content=log_data.model_dump_json(), status_code=202, media_type="application/json")
+    return serialization.json_response(serialization.SESSION_LOG, await crud.create_workout_session_log(db, log_data=log_data))
+
+@app.post("/api/logs/session/batch", response_model=schemas.WorkoutSessionLogBatchResponse)
+async def log_workout_sets_batch(logs_data: List[schemas.WorkoutSessionLogCreate], db: AsyncSession = Depends(database.get_db)):
+    if not logs_data:
+        raise HTTPException(status_code=400, detail="At least one set must be provided")
+    if len(logs_data) > MAX_LOG_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"A batch can contain at most {MAX_LOG_BATCH_SIZE} sets")
+    ensure_not_archived([log.date for log in logs_data])
+    created, duplicates = await crud.create_workout_session_logs_batch(db, logs_data=logs_data)
+    return serialization.json_response(serialization.SESSION_LOG_BATCH, {"created": created, "duplicates": duplicates})
 
 @app.put("/api/workout-day-exercise/{day_exercise_id}/change-exercise", response_model=schemas.WorkoutDayExercise)
 async def change_exercise_in_plan(day_exercise_id: int, exercise_change: schemas.ExerciseChange, db: AsyncSession = Depends(database.get_db)):
     updated_exercise_entry = await crud.update_exercise_in_plan(db, day_exercise_id, exercise_change.new_exercise_id)
     if not updated_exercise_entry:
         raise HTTPException(status_code=404, detail="Workout day exercise entry not found")
-    return updated_exercise_entry
+    return serialization.json_response(serialization.WORKOUT_DAY_EXERCISE, updated_exercise_entry)
 
 @app.put("/api/workout-day-exercise/{day_exercise_id}", response_model=schemas.WorkoutDayExercise)
 async def update_exercise_in_plan(day_exercise_id: int, exercise_update: schemas.WorkoutDayExerciseUpdate, db: AsyncSession = Depends(database.get_db)):
     updated_exercise = await crud.update_workout_day_exercise(db, day_exercise_id, exercise_update)
     if not updated_exercise:
         raise HTTPException(status_code=404, detail="Exercise in plan not found")
-    return updated_exercise
+    return serialization.json_response(serialization.WORKOUT_DAY_EXERCISE, updated_exercise)
 
 @app.delete("/api/workout-day-exercise/{day_exercise_id}", response_model=schemas.StatusResponse)
 async def remove_exercise_from_plan(day_exercise_id: int, db: AsyncSession = Depends(database.get_db)):
@@ -110,18 +335,30 @@ async def add_exercise_to_plan(day_id: int, exercise_add: schemas.WorkoutDayExer
     new_exercise_entry = await crud.add_exercise_to_workout_day(db, day_id, exercise_add)
     if not new_exercise_entry:
         raise HTTPException(status_code=404, detail="Workout day not found")
-    return new_exercise_entry
+    return serialization.json_response(serialization.WORKOUT_DAY_EXERCISE, new_exercise_entry)
 
-# --- Exercise Library Endpoint ---
-
-@app.get("/api/exercises/", response_model=List[schemas.Exercise])
-async def list_all_exercises(db: AsyncSession = Depends(database.get_db)):
-    return await crud.get_all_exercises(db)
+@app.patch("/api/workout-day/{day_id}", response_model=schemas.WorkoutDay)
+async def edit_workout_day(day_id: int, day_edit: schemas.WorkoutDayEdit, db: AsyncSession = Depends(database.get_db)):
+    """
+    Applies an ordered list of update/replace/remove/add operations to a day atomically
+    and returns the resulting day. Either every operation is applied or none is.
+    """
+    try:
+        workout_day = await crud.edit_workout_day(db, day_id, day_edit.operations)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if not workout_day:
+        raise HTTPException(status_code=404, detail="Workout day not found")
+    return serialization.json_response(serialization.WORKOUT_DAY, workout_day)
 
+# --- Exercise Library Endpoint ---
 
 @app.get("/api/templates/", response_model=List[schemas.WorkoutTemplate])
-async def list_all_templates(db: AsyncSession = Depends(database.get_db)):
-    return await crud.get_all_templates(db)
+async def list_all_templates(request: Request, db: AsyncSession = Depends(database.get_read_db)):
+    return await cache.cached_json_response(
+        request, cache.library_cache, ("templates",), serialization.TEMPLATE_LIST,
+        lambda: crud.get_all_templates(db),
+    )
 
 @app.put("/api/workout-day/{day_id}/swap-template", response_model=List[schemas.WorkoutDayExercise])
 async def swap_day_template(day_id: int, template_swap: schemas.TemplateSwap, db: AsyncSession = Depends(database.get_db)):
@@ -134,11 +371,33 @@ async def swap_day_template(day_id: int, template_swap: schemas.TemplateSwap, db
     if user.goal <= 3: sets, reps = 3, "12-15"
     elif user.goal > 6: sets, reps = 5, "4-6"
 
-    return await crud.swap_workout_day_with_template(db, day_id, template_swap.template_id, sets, reps)
+    new_exercises = await crud.swap_workout_day_with_template(db, day_id, template_swap.template_id, sets, reps, user_id=user.id)
+    if new_exercises is None:
+        raise HTTPException(status_code=404, detail="Workout day or template not found")
+    return serialization.json_response(serialization.WORKOUT_DAY_EXERCISE_LIST, new_exercises)
+
+@app.get("/api/exercises/search", response_model=schemas.ExerciseSearchResponse)
+async def search_exercises(
+    q: str = "",
+    type: str | None = None,
+    muscle_group_ids: List[int] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    """
+    Ranked exercise search with name prefix and typo-tolerant matching, filterable by
+    type and muscle groups. Served from an in-memory index built from the library.
+    """
+    index = await exercise_search.get_index(db)
+    return serialization.json_response(
+        serialization.EXERCISE_SEARCH, index.search(q, type=type, muscle_group_ids=muscle_group_ids, limit=limit, offset=offset),
+    )
 
 @app.get("/api/exercises/", response_model=List[schemas.Exercise])
 async def list_all_exercises(
-    db: AsyncSession = Depends(database.get_db),
+    request: Request,
+    db: AsyncSession = Depends(database.get_read_db),
     # Allow filtering by a list of muscle group IDs passed as query parameters
     # e.g., /api/exercises/?muscle_group_ids=1&muscle_group_ids=2
     muscle_group_ids: List[int] = Query(None)
@@ -146,7 +405,15 @@ async def list_all_exercises(
     """
     Provides a list of all available exercises from the library.
     Can be filtered by one or more muscle group IDs.
+    Responses are cached in-process with an ETag until the library changes.
     """
     if muscle_group_ids:
-        return await crud.get_exercises_by_muscle_group_ids(db, muscle_group_ids=muscle_group_ids)
-    return await crud.get_all_exercises(db)
+        group_ids = sorted(set(muscle_group_ids))
+        return await cache.cached_json_response(
+            request, cache.library_cache, ("exercises", tuple(group_ids)), serialization.EXERCISE_LIST,
+            lambda: crud.get_exercises_by_muscle_group_ids(db, muscle_group_ids=group_ids),
+        )
+    return await cache.cached_json_response(
+        request, cache.library_cache, ("exercises",), serialization.EXERCISE_LIST,
+        lambda: crud.get_all_exercises(db),
+    )
@@ -0,0 +1,125 @@
+"""
+Prometheus instrumentation for HTTP requests and database access.
+
+Engine events count the queries and DB time of the current request, and pool
+checkout/checkin events time how long connections are held; together with the
+pool gauges this shows when requests queue for a connection. All of it is
+exported by the /metrics endpoint in main.py.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["method", "route", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Number of SQL statements executed per request.", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Total time spent executing SQL per request.", ["method", "route"],
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, inside or outside requests.")
+POOL_CONNECTION_HOLD = Histogram(
+    "db_pool_connection_hold_seconds", "Time a connection stays checked out of the pool before it is returned.", ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+POOL_SIZE = Gauge("db_pool_size", "Configured number of pooled connections.", ["engine"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", ["engine"])
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size.", ["engine"])
+
+LOG_BUFFER_DEPTH = Gauge("log_buffer_depth", "Logged sets waiting in the write-behind buffer.")
+LOG_BUFFER_FLUSH_SECONDS = Histogram(
+    "log_buffer_flush_seconds", "Time taken to write out the write-behind buffer.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+LOG_BUFFER_FLUSHED_ROWS = Counter("log_buffer_flushed_rows_total", "Buffered sets written to the database.")
+LOG_BUFFER_DUPLICATE_ROWS = Counter(
+    "log_buffer_duplicate_rows_total", "Buffered sets not written because the same set was already stored.",
+)
+LOG_BUFFER_DROPPED_ROWS = Counter("log_buffer_dropped_rows_total", "Buffered sets dropped because the database rejected them.")
+
+class RequestStats:
+    __slots__ = ("query_count", "db_seconds")
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_seconds = 0.0
+
+
+# Stats of the request being handled by the current task, if any
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Stats of the request being handled, when called from inside metrics_middleware."""
+    return _request_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    DB_QUERIES.inc()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engine(engine: AsyncEngine, name: str = "primary"):
+    """Registers query timing events and pool gauges, labelled with `name`, on the engine."""
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+    # Pools have no event before a checkout, so the time spent waiting for a connection
+    # is not observable; long holds while db_pool_checked_out sits at the pool size are
+    # what make requests wait
+    pool = sync_engine.pool
+    hold_time = POOL_CONNECTION_HOLD.labels(name)
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_time"] = time.perf_counter()
+
+    def on_checkin(dbapi_connection, connection_record):
+        checkout_time = connection_record.info.pop("checkout_time", None)
+        if checkout_time is not None:
+            hold_time.observe(time.perf_counter() - checkout_time)
+
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+    # Not every pool class (e.g. NullPool, StaticPool) keeps these counters
+    for gauge, attribute in ((POOL_SIZE, "size"), (POOL_CHECKED_OUT, "checkedout"), (POOL_OVERFLOW, "overflow")):
+        if hasattr(pool, attribute):
+            gauge.labels(name).set_function(getattr(pool, attribute))
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Records latency, query count and DB time of every request, labelled by route template."""
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        _request_stats.reset(token)
+        # Label by the matched path template to keep label cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, route_path, str(status)).observe(elapsed)
+        REQUEST_DB_QUERIES.labels(request.method, route_path).observe(stats.query_count)
+        REQUEST_DB_TIME.labels(request.method, route_path).observe(stats.db_seconds)
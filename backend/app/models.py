@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Text, Index, PrimaryKeyConstraint, UniqueConstraint, func, literal_column
+from sqlalchemy.dialects import postgresql # Registers the full-text search functions used below
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship, declarative_base
 
 # The declarative_base() function returns a new base class from which all
 # mapped classes should inherit. This is the standard way to start with SQLAlchemy ORM.
 Base = declarative_base()
 
+def notes_tsvector(notes):
+    """The tsvector expression of a notes column. Queries must use it verbatim to hit the GIN index."""
+    return func.to_tsvector(literal_column("'english'"), notes)
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
@@ -93,6 +99,69 @@ class WorkoutSessionLog(Base):
     user = relationship("User")
     exercise = relationship("Exercise")
 
+    # Per-user date lookups and range scans are the hot path for logs
+    __table_args__ = (
+        Index('ix_workout_session_logs_user_id_date', 'user_id', 'date'),
+        # A set is identified by user, exercise, day and set number; retried submissions must not store it twice
+        Index('uq_workout_session_logs_set', 'user_id', 'exercise_id', 'date', 'sets', unique=True),
+        # Full-text search over notes; other databases fall back to notes_search.py
+        Index('ix_workout_session_logs_notes_fts', notes_tsvector(notes), postgresql_using='gin').ddl_if(dialect='postgresql'),
+        # Monthly range partitions on Postgres, created and archived by partitions.py
+        {'postgresql_partition_by': 'RANGE (date)', 'info': {'partition_key': 'date'}},
+    )
+
+class ExerciseProgressRollup(Base):
+    """
+    Per user, exercise and day summary of WorkoutSessionLog rows, kept up to date
+    whenever logs are written or deleted so progress charts never scan raw logs.
+    """
+    __tablename__ = 'exercise_progress_rollups'
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    exercise_id = Column(Integer, ForeignKey('exercises.id'), nullable=False)
+    date = Column(Date, nullable=False)
+    set_count = Column(Integer, nullable=False)
+    total_reps = Column(Integer, nullable=False)
+    volume_kg = Column(Float, nullable=False) # Sum of reps x weight
+    top_weight_kg = Column(Float, nullable=False)
+    estimated_1rm_kg = Column(Float, nullable=False) # Best Epley estimate of the day
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'exercise_id', 'date', name='uq_exercise_progress_rollups_user_exercise_date'),
+    )
+
+class ExerciseRecommendation(Base):
+    """
+    Next target load and reps for one user and planned exercise, written in bulk by the
+    nightly job in recommendations.py from the user's recent logs.
+    """
+    __tablename__ = 'exercise_recommendations'
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    exercise_id = Column(Integer, ForeignKey('exercises.id'), nullable=False)
+    target_weight_kg = Column(Float, nullable=False)
+    target_reps = Column(Integer, nullable=False)
+    estimated_1rm_kg = Column(Float, nullable=False) # Best Epley estimate in the lookback window
+    last_session_date = Column(Date, nullable=False) # Session the targets progress from
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'exercise_id', name='uq_exercise_recommendations_user_exercise'),
+    )
+
+class PlanGenerationJob(Base):
+    """
+    Status of a background plan generation job (see plan_jobs.py), stored so that any
+    API process can answer a poll, not only the one running the job.
+    """
+    __tablename__ = 'plan_generation_jobs'
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    status = Column(String(16), nullable=False) # pending, running, done or failed
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True), index=True) # Finished jobs are purged by age
+
 
 class WorkoutTemplate(Base):
     __tablename__ = 'workout_templates'
@@ -106,4 +175,34 @@ class WorkoutTemplateExercise(Base):
     template_id = Column(Integer, ForeignKey('workout_templates.id'))
     exercise_id = Column(Integer, ForeignKey('exercises.id'))
     template = relationship("WorkoutTemplate", back_populates="exercises")
-    exercise = relationship("Exercise")
\ No newline at end of file
+    exercise = relationship("Exercise")
+
+class CatalogVersion(Base):
+    """Single-row table holding the version of catalog.json last applied by seeding."""
+    __tablename__ = 'catalog_version'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def _compile_primary_key(constraint, compiler, **kw):
+    """
+    Postgres requires the primary key of a partitioned table to include the partition
+    key, so there such tables get (id, partition key). Other databases keep the plain
+    id key, which SQLite needs for autoincrement.
+    """
+    partition_key = constraint.table.info.get('partition_key')
+    if partition_key is None or partition_key in constraint.columns:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [*constraint.columns, constraint.table.c[partition_key]]
+    name = f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} " if constraint.name is not None else ""
+    return f"{name}PRIMARY KEY ({', '.join(compiler.preparer.quote(column.name) for column in columns)})"
+
+def create_missing_indexes(connection):
+    """
+    metadata.create_all() only creates missing tables, so indexes added to a model
+    after its table already exists are created here.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
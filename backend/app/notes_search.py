@@ -0,0 +1,147 @@
+"""
+In-process BM25 index over session log notes, used when the database has no full-text
+search of its own (SQLite). On Postgres, crud queries the GIN-indexed tsvector instead.
+
+Searches are always scoped to one user, so there is one small index per user. A user's
+index is built from the database on their first search, then kept current by crud as
+logs are written and deleted. Only the most recently searched users stay loaded.
+"""
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+from datetime import date
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have i in is it its my of on or so that the this to was were with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class NotesIndex:
+    """Inverted index of one user's notes, ranked with Okapi BM25."""
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._docs: Dict[int, Tuple[date, int]] = {} # log_id -> (date, token count)
+        self._doc_terms: Dict[int, List[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, log_id: int, log_date: date, notes: Optional[str]):
+        self.remove(log_id)
+        tokens = tokenize(notes or "")
+        if not tokens:
+            return
+        frequencies = Counter(tokens)
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[log_id] = frequency
+        self._docs[log_id] = (log_date, len(tokens))
+        self._doc_terms[log_id] = list(frequencies)
+        self._total_length += len(tokens)
+
+    def remove(self, log_id: int):
+        doc = self._docs.pop(log_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc[1]
+        for term in self._doc_terms.pop(log_id):
+            postings = self._postings[term]
+            del postings[log_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, from_date: Optional[date] = None, to_date: Optional[date] = None) -> List[Tuple[int, float]]:
+        """Returns (log_id, score) for every note matching a query term, best first."""
+        if not self._docs:
+            return []
+        doc_count = len(self._docs)
+        average_length = self._total_length / doc_count
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for log_id, frequency in postings.items():
+                log_date, length = self._docs[log_id]
+                if (from_date and log_date < from_date) or (to_date and log_date > to_date):
+                    continue
+                norm = frequency + K1 * (1 - B + B * length / average_length)
+                scores[log_id] = scores.get(log_id, 0.0) + idf * frequency * (K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+class UserNotesIndexes:
+    """
+    LRU registry of per-user indexes. Writes to a loaded index are applied in place;
+    writes for other users are ignored, since their index is built from the database
+    when next needed. Writes that land while an index is being built are replayed onto
+    it, whether or not the rows it read already included them.
+    """
+    def __init__(self, max_users: int = 1000):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[int, NotesIndex]" = OrderedDict()
+        self._building: Dict[int, List[list]] = {} # user_id -> writes seen by each build in flight
+
+    async def load(self, user_id: int, fetch_notes: Callable[[], Awaitable[Iterable[Tuple[int, date, Optional[str]]]]]) -> NotesIndex:
+        """Returns the user's index, building it from the (log_id, date, notes) rows of `fetch_notes` if needed."""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+            return index
+
+        writes: list = []
+        self._building.setdefault(user_id, []).append(writes)
+        try:
+            rows = await fetch_notes()
+        finally:
+            in_flight = [other for other in self._building[user_id] if other is not writes]
+            if in_flight:
+                self._building[user_id] = in_flight
+            else:
+                del self._building[user_id]
+
+        index = NotesIndex()
+        for log_id, log_date, notes in rows:
+            index.add(log_id, log_date, notes)
+        for log_id, log_date, notes in writes:
+            if log_date is None:
+                index.remove(log_id)
+            else:
+                index.add(log_id, log_date, notes)
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def add_logs(self, logs: Iterable):
+        for log in logs:
+            self._apply(log.user_id, (log.id, log.date, log.notes))
+
+    def remove_log(self, user_id: int, log_id: int):
+        self._apply(user_id, (log_id, None, None))
+
+    def _apply(self, user_id: int, write: Tuple[int, Optional[date], Optional[str]]):
+        for writes in self._building.get(user_id, ()):
+            writes.append(write)
+        index = self._indexes.get(user_id)
+        if index is not None:
+            log_id, log_date, notes = write
+            if log_date is None:
+                index.remove(log_id)
+            else:
+                index.add(log_id, log_date, notes)
+
+
+notes_indexes = UserNotesIndexes(int(os.getenv("NOTES_INDEX_MAX_USERS", "1000")))
@@ -0,0 +1,312 @@
+"""
+Monthly partitions of workout_session_logs and their archival to cold storage.
+
+On Postgres the table is range-partitioned by date, one partition per month
+(workout_session_logs_p2025_01, ...). Inserts and per-date lookups then only touch the
+small partitions of recent months, and old months are removed by dropping their
+partition instead of deleting rows, so they leave no bloat for vacuum to clean up.
+
+Partitions are created for the next PARTITION_MONTHS_AHEAD months when the database is
+prepared at startup, and on demand by crud before logs for any other month are
+inserted. Archival moves every month older than LOG_ARCHIVE_AFTER_MONTHS into
+log_archive's files, oldest first. Run it from cron during the maintenance window,
+on a host that shares LOG_ARCHIVE_DIR with the API:
+
+    python -m app.partitions archive
+    python -m app.partitions archive --older-than-months 18
+    python -m app.partitions maintain
+
+Databases created before partitioning keep their plain table until it is converted,
+once, while the API is stopped; this copies every row:
+
+    python -m app.partitions convert
+
+Databases that stored a set twice before the unique set index existed refuse to start
+until the extra copies are deleted, keeping the first of each; review them first:
+
+    python -m app.partitions dedupe --dry-run
+    python -m app.partitions dedupe
+
+Other databases (SQLite in development) have no partitions; archival there deletes
+the archived rows instead.
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+from datetime import date
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import delete, func, select, text
+
+from . import crud, database, log_archive, models
+
+TABLE = models.WorkoutSessionLog.__tablename__
+PARTITION_PATTERN = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+# Any constant works as long as nothing else in the database uses it for an advisory lock
+PARTITION_LOCK_ID = 746_172_552
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("LOG_ARCHIVE_AFTER_MONTHS", "12"))
+
+ARCHIVE_COLUMNS = ("id", "user_id", "exercise_id", "date", "sets", "reps", "weight_kg", "notes")
+
+# Months known to have a partition in this process, and whether the table is partitioned at all
+_known_months: Set[date] = set()
+_partitioned: Optional[bool] = None
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month:%Y_%m}"
+
+
+def _uses_partitions() -> bool:
+    return database.engine.dialect.name == "postgresql"
+
+
+async def is_partitioned(conn) -> bool:
+    result = await conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": TABLE})
+    return result.scalar() == "p"
+
+
+async def existing_partitions(conn) -> Dict[date, str]:
+    """Month -> partition name of every monthly partition of the table."""
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": TABLE},
+    )
+    partitions = {}
+    for name in result.scalars():
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+async def create_partitions(conn, months: Iterable[date]):
+    """Creates the missing partitions for the given months inside the caller's transaction."""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+    existing = await existing_partitions(conn)
+    for month in sorted(set(months) - existing.keys()):
+        # Identifiers and bounds are generated from dates, never from user input
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE}"
+            f" FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    _known_months.update(months)
+
+
+async def prepare(conn):
+    """Called while the database is prepared: creates this month's partition and the next ones."""
+    global _partitioned
+    if not _uses_partitions():
+        return
+    _partitioned = await is_partitioned(conn)
+    if not _partitioned:
+        print(f"{TABLE} is not partitioned; run `python -m app.partitions convert` during a maintenance window")
+        return
+    current = month_start(date.today())
+    await create_partitions(conn, [add_months(current, offset) for offset in range(PARTITION_MONTHS_AHEAD + 1)])
+
+
+async def ensure_for_dates(dates: Iterable[date]):
+    """
+    Makes sure partitions exist for logs about to be inserted. Months already seen by
+    this process cost a set lookup; others are created in a short transaction of their own.
+    Archived months are left without a partition, so inserts into them still fail.
+    """
+    global _partitioned
+    if not _uses_partitions() or _partitioned is False:
+        return
+    months = {month_start(day) for day in dates} - _known_months
+    archived_before = log_archive.archive.archived_before()
+    if archived_before is not None:
+        months = {month for month in months if month >= archived_before}
+    if not months:
+        return
+    async with database.engine.begin() as conn:
+        if _partitioned is None:
+            _partitioned = await is_partitioned(conn)
+            if not _partitioned:
+                return
+        await create_partitions(conn, months)
+
+
+async def convert():
+    """Recreates an unpartitioned table as a partitioned one, copying every row."""
+    legacy = f"{TABLE}_unpartitioned"
+    async with database.engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+        if await is_partitioned(conn):
+            print(f"{TABLE} is already partitioned")
+            return
+
+        # Move the old table, its indexes and its id sequence out of the way of the new ones
+        await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+        indexes = await conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": legacy})
+        for index in indexes.scalars().all():
+            await conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index[:55]}_legacy"'))
+        sequence = (await conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": legacy})).scalar()
+        if sequence:
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {TABLE}_id_seq_legacy"))
+
+        await conn.run_sync(models.Base.metadata.create_all, tables=[models.WorkoutSessionLog.__table__])
+        first, last = (await conn.execute(text(f"SELECT min(date), max(date) FROM {legacy}"))).one()
+        current = month_start(date.today())
+        months = {add_months(current, offset) for offset in range(PARTITION_MONTHS_AHEAD + 1)}
+        month = month_start(first or current)
+        while month <= (last or current):
+            months.add(month)
+            month = add_months(month, 1)
+        await create_partitions(conn, months)
+
+        # Sets stored twice before the unique set index existed keep only their first copy
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        copied = await conn.execute(text(
+            f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {legacy} ORDER BY id ON CONFLICT DO NOTHING"
+        ))
+        total = (await conn.execute(text(f"SELECT count(*) FROM {legacy}"))).scalar()
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+        ))
+        await conn.execute(text(f"DROP TABLE {legacy}"))
+    print(f"Converted {TABLE} to monthly partitions, copied {copied.rowcount} rows")
+    if copied.rowcount != total:
+        print(f"Skipped {total - copied.rowcount} duplicate sets; run `python -m app.progress --rebuild` to update the rollups")
+
+
+def _archive_query(month: date):
+    log = models.WorkoutSessionLog
+    return (
+        [getattr(log, column) for column in ARCHIVE_COLUMNS],
+        (log.date >= month, log.date < add_months(month, 1)),
+        (log.user_id, log.date, log.id),
+    )
+
+
+async def _archive_partition(month: date, name: str) -> int:
+    """Copies a partition to its archive file, then drops it."""
+    columns, filters, order = _archive_query(month)
+
+    async def write_file(conn) -> int:
+        rows = (await conn.execute(select(*columns).filter(*filters).order_by(*order))).all()
+        return log_archive.archive.write_month(month, rows) if rows else 0
+
+    # Writes to the month wait while it is copied; reads and other months are not blocked.
+    # Once the file exists, the API refuses new logs for the month and reads it from there.
+    async with database.engine.begin() as conn:
+        await conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+        archived = await write_file(conn)
+
+    async with database.engine.begin() as conn:
+        await conn.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+        # A write that was already waiting for the lock above may have landed since
+        if (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar() != archived:
+            archived = await write_file(conn)
+        await conn.execute(text(f"DROP TABLE {name}"))
+    return archived
+
+
+async def _archive_rows(month: date) -> int:
+    """Deletes a month's rows and archives what was deleted, for databases without partitions."""
+    columns, filters, _ = _archive_query(month)
+    async with database.engine.begin() as conn:
+        rows = (await conn.execute(delete(models.WorkoutSessionLog).filter(*filters).returning(*columns))).all()
+        rows.sort(key=lambda row: (row.user_id, row.date, row.id))
+        return log_archive.archive.write_month(month, rows) if rows else 0
+
+
+async def archive_old_months(older_than_months: int = ARCHIVE_AFTER_MONTHS):
+    """Archives every month that ended more than `older_than_months` months ago, oldest first."""
+    cutoff = add_months(month_start(date.today()), -older_than_months)
+    started = time.perf_counter()
+    archived = {}
+
+    if _uses_partitions():
+        async with database.engine.connect() as conn:
+            if not await is_partitioned(conn):
+                print(f"{TABLE} is not partitioned; run `python -m app.partitions convert` first")
+                return
+            partitions = await existing_partitions(conn)
+        for month, name in sorted(partitions.items()):
+            if month < cutoff:
+                archived[month] = await _archive_partition(month, name)
+    else:
+        async with database.engine.connect() as conn:
+            first = (await conn.execute(select(func.min(models.WorkoutSessionLog.date)))).scalar()
+        month = month_start(first) if first else cutoff
+        while month < cutoff:
+            archived[month] = await _archive_rows(month)
+            month = add_months(month, 1)
+
+    for month, rows in archived.items():
+        print(f"Archived {month:%Y-%m}: {rows} rows")
+    print(f"Archived {len(archived)} months before {cutoff} in {time.perf_counter() - started:.1f}s")
+
+
+async def dedupe(dry_run: bool):
+    """Deletes, or with `dry_run` only lists, the logs that repeat an already logged set."""
+    async with database.SessionLocal() as db:
+        if dry_run:
+            duplicates = await crud.get_duplicate_session_logs(db)
+        else:
+            duplicates = await crud.delete_duplicate_session_logs(db)
+    action = "Would delete" if dry_run else "Deleted"
+    for log in duplicates:
+        print(f"{action} log {log.id}: user {log.user_id}, exercise {log.exercise_id}, {log.date} set {log.sets}, "
+              f"{log.reps} x {log.weight_kg} kg, notes {log.notes!r}")
+    print(f"{action} {len(duplicates)} duplicate session logs")
+
+
+async def maintain():
+    async with database.engine.begin() as conn:
+        await prepare(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of the session logs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive_parser = commands.add_parser("archive", help="Move old months to the log archive.")
+    archive_parser.add_argument(
+        "--older-than-months", type=int, default=ARCHIVE_AFTER_MONTHS,
+        help="Archive months that ended more than this many months ago.",
+    )
+    commands.add_parser("maintain", help="Create the partitions of the coming months.")
+    commands.add_parser("convert", help="Convert an unpartitioned table, copying every row.")
+    dedupe_parser = commands.add_parser("dedupe", help="Delete logs that repeat an already logged set.")
+    dedupe_parser.add_argument("--dry-run", action="store_true", help="Only list the logs that would be deleted.")
+    args = parser.parse_args()
+
+    async def run_job():
+        try:
+            if args.command == "archive":
+                await archive_old_months(args.older_than_months)
+            elif args.command == "maintain":
+                await maintain()
+            elif args.command == "dedupe":
+                await dedupe(args.dry_run)
+            else:
+                await convert()
+        finally:
+            await database.engine.dispose()
+
+    asyncio.run(run_job())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Background plan generation.
+
+POST /api/users/{user_id}/plan/ saves the plan details and enqueues a job instead of
+generating the week inside the request. Jobs run on a bounded in-process worker queue,
+each with its own session. Their status is also written to the plan_generation_jobs
+table, so a poll answered by another worker, or by this one after a restart, still
+finds the job. Finished jobs are deleted after PLAN_JOB_RETENTION_HOURS.
+
+A request for a user who already has a job waiting joins that job rather than queueing
+another one. If the user's job is already running, one follow-up job is queued and it
+starts only after the running one has finished, so two generations for the same user
+never overlap. Coalescing is per process: requests for the same user handled by two
+workers may run two jobs, and the plan written last wins.
+"""
+import asyncio
+import os
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Literal, Optional, Protocol, Union
+
+from . import crud, database, models, workout_generator
+
+JobStatus = Literal["pending", "running", "done", "failed"]
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room left; callers should retry later."""
+
+
+class PlanJob:
+    def __init__(self, user_id: int, after: Optional["PlanJob"] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status: JobStatus = "pending"
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        # Job for the same user that must finish before this one starts
+        self.after = after
+        self.finished = asyncio.Event()
+        # Set once the job's row exists, so that status updates do not overtake it
+        self.stored = asyncio.Event()
+
+
+class JobQueueBackend(Protocol):
+    """Runs submitted jobs. The in-process queue below is the local stand-in for a broker."""
+    async def start(self, run: Callable[[PlanJob], Awaitable[None]]) -> None: ...
+    def submit(self, job: PlanJob) -> None: ...
+    async def stop(self) -> None: ...
+
+
+class InProcessJobBackend:
+    """A bounded asyncio queue drained by a fixed number of worker tasks."""
+    def __init__(self, workers: int = 2, max_queued: int = 100):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+
+    async def start(self, run: Callable[[PlanJob], Awaitable[None]]):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+
+        async def worker():
+            while True:
+                job = await self._queue.get()
+                try:
+                    await run(job)
+                finally:
+                    self._queue.task_done()
+
+        self._tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+
+    def submit(self, job: PlanJob):
+        if self._queue is None:
+            raise RuntimeError("The plan job queue has not been started")
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Too many plan generation jobs are queued") from None
+
+    async def stop(self):
+        # Let queued jobs finish, then stop the idle workers
+        if self._queue is not None:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+class PlanJobQueue:
+    """
+    Tracks plan generation jobs and coalesces duplicate requests per user.
+
+    Finished jobs stay in memory until `max_finished` newer ones have finished, and in
+    the database for `retention_seconds`.
+    """
+    def __init__(self, backend: JobQueueBackend, max_finished: int = 10_000, retention_seconds: float = 24 * 3600):
+        self.backend = backend
+        self.max_finished = max_finished
+        self.retention_seconds = retention_seconds
+        self._next_purge = 0.0
+        self._jobs: Dict[str, PlanJob] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._pending_by_user: Dict[int, PlanJob] = {}
+        self._running_by_user: Dict[int, PlanJob] = {}
+
+    async def start(self):
+        await self.backend.start(self._run)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    async def get(self, job_id: str) -> Union[PlanJob, models.PlanGenerationJob, None]:
+        """A job of this process, else the stored status of one queued by another process."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        # The primary, since a job queued a moment ago may not have reached a replica yet
+        async with database.SessionLocal() as db:
+            return await crud.get_plan_generation_job(db, job_id)
+
+    async def enqueue(self, user_id: int) -> PlanJob:
+        """Returns the user's waiting job, or queues a new one."""
+        pending = self._pending_by_user.get(user_id)
+        if pending is not None:
+            return pending
+
+        job = PlanJob(user_id, after=self._running_by_user.get(user_id))
+        self.backend.submit(job)
+        self._jobs[job.id] = job
+        self._pending_by_user[user_id] = job
+        try:
+            async with database.SessionLocal() as db:
+                await crud.create_plan_generation_job(db, job.id, user_id, job.created_at)
+        finally:
+            job.stored.set()
+        return job
+
+    async def _run(self, job: PlanJob):
+        if job.after is not None:
+            await job.after.finished.wait()
+            job.after = None
+        await job.stored.wait()
+
+        # From here on a new request needs a new job, since this one may already have read the plan
+        self._pending_by_user.pop(job.user_id, None)
+        self._running_by_user[job.user_id] = job
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        await self._store(job, status=job.status, started_at=job.started_at)
+        try:
+            async with database.SessionLocal() as db:
+                generated = await workout_generator.generate_and_save_plan_for_user(db, job.user_id)
+            if generated:
+                job.status = "done"
+            else:
+                job.status = "failed"
+                job.error = "User or plan details not found"
+        except Exception as exc:
+            traceback.print_exc()
+            job.status = "failed"
+            job.error = f"{type(exc).__name__}: {exc}"
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            if self._running_by_user.get(job.user_id) is job:
+                del self._running_by_user[job.user_id]
+            await self._store(job, status=job.status, error=job.error, finished_at=job.finished_at)
+            job.finished.set()
+            self._record_finished(job)
+            await self._purge_expired()
+
+    async def _store(self, job: PlanJob, **fields):
+        # A failed status write only affects polls answered by other processes
+        try:
+            async with database.SessionLocal() as db:
+                await crud.update_plan_generation_job(db, job.id, **fields)
+        except Exception:
+            traceback.print_exc()
+
+    def _record_finished(self, job: PlanJob):
+        self._finished[job.id] = None
+        while len(self._finished) > self.max_finished:
+            expired_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(expired_id, None)
+
+    async def _purge_expired(self):
+        """Deletes the stored jobs that finished more than `retention_seconds` ago, at most once a minute."""
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + 60
+        finished_before = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        try:
+            async with database.SessionLocal() as db:
+                await crud.delete_finished_plan_generation_jobs(db, finished_before)
+        except Exception:
+            traceback.print_exc()
+
+
+plan_jobs = PlanJobQueue(InProcessJobBackend(
+    workers=int(os.getenv("PLAN_JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("PLAN_JOB_QUEUE_SIZE", "100")),
+), retention_seconds=float(os.getenv("PLAN_JOB_RETENTION_HOURS", "24")) * 3600)
@@ -0,0 +1,233 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_TOKEN>` or is picked
+by PROFILE_SAMPLE_RATE (0 to 1). While it runs, a background thread samples the event
+loop thread's Python stack every PROFILE_INTERVAL_MS. When the response has been sent,
+two files are written to PROFILE_DIR:
+
+- `<id>.folded`: collapsed stacks, one `frame;frame;frame count` line per distinct
+  stack, readable by flamegraph.pl, speedscope and inferno;
+- `<id>.json`: the request, its duration, and where that time went by phase
+  (db, orm, serialization, app and await), estimated from the share of samples in
+  each, next to the SQL time measured by the engine events in metrics.py.
+
+The response carries the profile id in an `X-Profile-Id` header. The sampler sees
+everything on the loop, so requests running concurrently with the profiled one show
+up in its samples too; only one request is profiled at a time per process. A request
+selected while another is being profiled is not profiled, which is logged. A profile
+whose response never finished sending (the client went away mid-stream) is abandoned
+after PROFILE_TIMEOUT_SECONDS, so it cannot block profiling for good.
+
+With neither PROFILE_TOKEN nor PROFILE_SAMPLE_RATE set, the middleware is not
+installed at all.
+"""
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from typing import Optional
+
+from fastapi import Request
+
+from . import metrics
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "fitify-profiles"))
+PROFILE_TIMEOUT_SECONDS = float(os.getenv("PROFILE_TIMEOUT_SECONDS", "60"))
+
+# Deepest stack recorded per sample; deeper frames are cut from the root end
+MAX_STACK_DEPTH = 200
+
+# A sample whose innermost frame is the event loop itself (or, under uvloop, the
+# asyncio.run() call) is idle, waiting on I/O: including SQL running in a driver thread
+# or on the server.
+_AWAIT_PATHS = ("selectors.py", "asyncio/base_events.py", "asyncio/runners.py")
+# Otherwise the innermost frame from one of these decides the phase; frames are matched by
+# file path. Everything else, application and framework code alike, counts as "app".
+_PHASE_PATHS = (
+    ("db", ("asyncpg", "aiosqlite", "sqlalchemy/engine", "sqlalchemy/dialects", "sqlalchemy/pool", "sqlalchemy/sql")),
+    ("orm", ("sqlalchemy/orm",)),
+    ("serialization", ("pydantic", "/json/", "fastapi/encoders.py", "app/serialization.py", "app/schemas.py")),
+)
+PHASES = ("await",) + tuple(phase for phase, _ in _PHASE_PATHS) + ("app",)
+
+
+def enabled() -> bool:
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+def _frame_label(code) -> str:
+    # Keep the last two path components: enough to tell packages apart, short enough to read
+    path = "/".join(code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _classify(paths) -> str:
+    """Phase of a sample, from the file paths of its frames, innermost first."""
+    if any(pattern in paths[0] for pattern in _AWAIT_PATHS):
+        return "await"
+    for path in paths:
+        for phase, patterns in _PHASE_PATHS:
+            if any(pattern in path for pattern in patterns):
+                return phase
+    return "app"
+
+
+class StackSampler:
+    """Samples one thread's stack from a background thread until stopped."""
+    def __init__(self, thread_id: int, interval_seconds: float):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self.phases: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            codes = []
+            while frame is not None and len(codes) < MAX_STACK_DEPTH:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if not codes:
+                continue
+            # codes runs innermost first; folded stacks are written root first
+            self.stacks[";".join(_frame_label(code) for code in reversed(codes))] += 1
+            self.phases[_classify([code.co_filename.replace("\\", "/") for code in codes])] += 1
+
+
+class RequestProfile:
+    def __init__(self, request: Request, stats: Optional[metrics.RequestStats]):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.method = request.method
+        self.path = request.url.path
+        self.stats = stats
+        self.start = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_SECONDS)
+        self.sampler.start()
+
+    def is_stale(self) -> bool:
+        return time.perf_counter() - self.start > PROFILE_TIMEOUT_SECONDS
+
+    def abandon(self):
+        self.sampler.stop()
+
+    def finish(self, request: Request, status: int):
+        self.sampler.stop()
+        duration = time.perf_counter() - self.start
+        route = request.scope.get("route")
+        samples = sum(self.sampler.phases.values())
+        breakdown = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": route.path if route is not None else None,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "interval_ms": PROFILE_INTERVAL_SECONDS * 1000,
+            "samples": samples,
+            "phases": {
+                phase: {
+                    "samples": self.sampler.phases[phase],
+                    "estimated_ms": round(duration * 1000 * self.sampler.phases[phase] / samples, 3) if samples else 0.0,
+                }
+                for phase in PHASES
+            },
+            "sql": {
+                "queries": self.stats.query_count,
+                "measured_ms": round(self.stats.db_seconds * 1000, 3),
+            } if self.stats is not None else None,
+        }
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        with open(base + ".folded", "w") as folded:
+            folded.writelines(f"{stack} {count}\n" for stack, count in self.sampler.stacks.items())
+        with open(base + ".json", "w") as summary:
+            json.dump(breakdown, summary, indent=2)
+
+
+# The sampler watches the whole event loop, so concurrent profiles would sample each other
+_active: Optional[RequestProfile] = None
+_active_lock = threading.Lock()
+
+
+def _wants_profile(request: Request) -> bool:
+    if PROFILE_TOKEN:
+        token = request.headers.get("x-profile-token")
+        if token is not None and hmac.compare_digest(token, PROFILE_TOKEN):
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _start(request: Request) -> Optional[RequestProfile]:
+    """Starts profiling the request, unless another profile is running."""
+    global _active
+    with _active_lock:
+        if _active is not None and _active.is_stale():
+            print(f"Abandoning profile {_active.id} of {_active.method} {_active.path}: "
+                  f"its response did not finish within {PROFILE_TIMEOUT_SECONDS:g}s")
+            _active.abandon()
+            _active = None
+        if _active is not None:
+            print(f"Not profiling {request.method} {request.url.path}: profile {_active.id} is still running")
+            return None
+        _active = RequestProfile(request, metrics.current_request_stats())
+        return _active
+
+
+def _finish(profile: RequestProfile, request: Request, status: int):
+    """Writes the profile, unless it was abandoned meanwhile, and frees the slot."""
+    global _active
+    with _active_lock:
+        if _active is not profile:
+            return
+        _active = None
+    try:
+        profile.finish(request, status)
+    except Exception:
+        traceback.print_exc()
+
+
+async def profiling_middleware(request: Request, call_next):
+    """Profiles the selected requests until their response body has been sent."""
+    profile = _start(request) if _wants_profile(request) else None
+    if profile is None:
+        return await call_next(request)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        _finish(profile, request, 500)
+        raise
+
+    # Streamed bodies (exports) are still being produced after call_next returns
+    body_iterator = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            _finish(profile, request, response.status_code)
+
+    response.body_iterator = profiled_body()
+    response.headers["X-Profile-Id"] = profile.id
+    return response
@@ -0,0 +1,113 @@
+"""
+Per-exercise progression and weekly muscle-group volume, built from the daily rollups
+in exercise_progress_rollups.
+
+The rollups are maintained by crud on every log write. To regenerate them from the
+raw logs, e.g. after a bulk import or a fix to the aggregation, run:
+
+    python -m app.progress --rebuild
+    python -m app.progress --rebuild --user-id 42
+"""
+import argparse
+import asyncio
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import cache, crud, database, models
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())  # Weeks start on Monday
+
+
+def _period_start(day: date, period: str) -> date:
+    return week_start(day) if period == "week" else day
+
+
+def summarize_progress(rollups: List[models.ExerciseProgressRollup], period: str) -> List[dict]:
+    """
+    Folds daily rollups (ordered by exercise and date) into one point per exercise
+    and day or week. Cost is proportional to the number of rollups, not of sets.
+    """
+    points: dict = {}
+    for rollup in rollups:
+        key = (rollup.exercise_id, _period_start(rollup.date, period))
+        point = points.get(key)
+        if point is None:
+            points[key] = {
+                "exercise_id": rollup.exercise_id,
+                "period_start": key[1],
+                "set_count": rollup.set_count,
+                "total_reps": rollup.total_reps,
+                "volume_kg": rollup.volume_kg,
+                "top_weight_kg": rollup.top_weight_kg,
+                "estimated_1rm_kg": rollup.estimated_1rm_kg,
+            }
+            continue
+        point["set_count"] += rollup.set_count
+        point["total_reps"] += rollup.total_reps
+        point["volume_kg"] += rollup.volume_kg
+        point["top_weight_kg"] = max(point["top_weight_kg"], rollup.top_weight_kg)
+        point["estimated_1rm_kg"] = max(point["estimated_1rm_kg"], rollup.estimated_1rm_kg)
+    return list(points.values())
+
+
+async def get_weekly_volume(db: AsyncSession, user_id: int, week_starts: List[date]) -> List[dict]:
+    """
+    Per-muscle-group volume for each of the given weeks (Monday dates), oldest first.
+    Cached weeks are served from cache.volume_cache; the others are computed together
+    with a single grouped query over the rollups.
+    """
+    weeks = {}
+    missing = {}
+    for start in week_starts:
+        cached = cache.volume_cache.get(user_id, start)
+        if cached is None:
+            missing[start] = cache.volume_cache.version(user_id, start)
+        else:
+            weeks[start] = cached
+
+    if missing:
+        rows = await crud.get_muscle_group_daily_volume(db, user_id, min(missing), max(missing) + timedelta(days=6))
+        computed = {start: {} for start in missing}
+        for day, group_id, group_name, set_count, total_reps, volume_kg in rows:
+            groups = computed.get(week_start(day))
+            if groups is None: # A cached week inside the queried span
+                continue
+            group = groups.setdefault(group_id, {
+                "muscle_group_id": group_id, "muscle_group": group_name, "set_count": 0, "total_reps": 0, "volume_kg": 0.0,
+            })
+            group["set_count"] += set_count
+            group["total_reps"] += total_reps
+            group["volume_kg"] += volume_kg
+        for start, version in missing.items():
+            weeks[start] = sorted(computed[start].values(), key=lambda group: group["muscle_group"])
+            cache.volume_cache.set(user_id, start, weeks[start], version)
+
+    return [{"week_start": start, "muscle_groups": weeks[start]} for start in sorted(weeks)]
+
+async def rebuild(user_id: Optional[int] = None):
+    async with database.SessionLocal() as db:
+        await crud.rebuild_exercise_progress(db, user_id=user_id)
+    print(f"Rebuilt progress rollups for {'user_id ' + str(user_id) if user_id else 'all users'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain per-exercise progression rollups.")
+    parser.add_argument("--rebuild", action="store_true", required=True, help="Regenerate rollups from raw session logs.")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild the rollups of this user.")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await rebuild(args.user_id)
+        finally:
+            await database.engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
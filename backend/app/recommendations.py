@@ -0,0 +1,212 @@
+"""
+Nightly progressive-overload recommendations.
+
+For every exercise in a user's plan, the next session's targets progress from the last
+logged session of that exercise (double progression over the planned rep range):
+
+- the weakest set at the top weight reached the top of the range: add load (2.5%,
+  at least one 2.5 kg step) and restart at the bottom of the range;
+- it fell short of the bottom of the range: take 5% off the load;
+- otherwise: keep the load and aim for one more rep.
+
+Logs from the lookback window are streamed in large chunks into NumPy columns and all
+users are processed together with sorted group reductions, so the cost is a few passes
+over the arrays rather than a Python loop per user. Results replace the
+exercise_recommendations table, which the plan endpoint reads by user. With
+PLAN_CACHE_REDIS_URL set, the job also drops the cached plans it changed; otherwise
+cached plans are served until they expire (PLAN_CACHE_TTL_SECONDS).
+
+Run it from cron during the maintenance window:
+
+    python -m app.recommendations
+    python -m app.recommendations --lookback-days 42
+"""
+import argparse
+import asyncio
+import re
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from . import cache, crud, database
+
+DEFAULT_LOOKBACK_DAYS = 42
+CHUNK_SIZE = 100_000
+WEIGHT_STEP_KG = 2.5 # Smallest load change, a pair of 1.25 kg plates
+LOAD_INCREASE = 0.025
+DELOAD_FACTOR = 0.95
+
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+RESULT_COLUMNS = ("user_id", "exercise_id", "target_weight_kg", "target_reps", "estimated_1rm_kg", "last_day")
+
+
+def parse_rep_range(reps: str) -> Tuple[int, int]:
+    """'8-12' -> (8, 12), '10' -> (10, 10). Unparseable targets fall back to 8-12."""
+    numbers = [int(number) for number in _NUMBER_PATTERN.findall(reps)]
+    if not numbers:
+        return 8, 12
+    return min(numbers), max(numbers)
+
+
+def _pair_keys(user_ids: np.ndarray, exercise_ids: np.ndarray) -> np.ndarray:
+    return (user_ids.astype(np.int64) << 32) | exercise_ids.astype(np.int64)
+
+
+def compute_recommendations(logs: Dict[str, np.ndarray], planned: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Computes targets for every planned (user, exercise) pair with logged history.
+
+    `logs` holds equal-length columns user_id, exercise_id, day (date ordinal), reps and
+    weight_kg; `planned` holds unique user_id, exercise_id pairs with their rep_low and
+    rep_high. Returns columns user_id, exercise_id, target_weight_kg, target_reps,
+    estimated_1rm_kg and last_day.
+    """
+    if len(logs["user_id"]) == 0:
+        return {name: np.empty(0) for name in RESULT_COLUMNS}
+
+    keys = _pair_keys(logs["user_id"], logs["exercise_id"])
+    order = np.lexsort((logs["day"], keys))
+    keys, days = keys[order], logs["day"][order]
+    reps, weights = logs["reps"][order], logs["weight_kg"][order]
+
+    # Rows are now grouped by pair and dated ascending within each group
+    new_group = np.r_[True, keys[1:] != keys[:-1]]
+    starts = np.flatnonzero(new_group)
+    group = np.cumsum(new_group) - 1
+    group_keys = keys[starts]
+    last_day = np.maximum.reduceat(days, starts)
+    in_last_session = days == last_day[group]
+
+    estimated_1rm = np.maximum.reduceat(weights * (1 + reps / 30.0), starts)
+    top_weight = np.maximum.reduceat(np.where(in_last_session, weights, -np.inf), starts)
+    at_top = in_last_session & (weights == top_weight[group])
+    reps_at_top = np.minimum.reduceat(np.where(at_top, reps, np.inf), starts)
+
+    # Keep the planned pairs that have history
+    planned_keys = _pair_keys(planned["user_id"], planned["exercise_id"])
+    position = np.searchsorted(group_keys, planned_keys)
+    found = position < len(group_keys)
+    found[found] = group_keys[position[found]] == planned_keys[found]
+    index = position[found]
+    rep_low, rep_high = planned["rep_low"][found], planned["rep_high"][found]
+    top, achieved = top_weight[index], reps_at_top[index]
+
+    progress = achieved >= rep_high
+    deload = achieved < rep_low
+    bodyweight = top <= 0
+    target_weight = np.select(
+        [bodyweight, progress, deload],
+        [
+            0.0,
+            np.round((top + np.maximum(WEIGHT_STEP_KG, top * LOAD_INCREASE)) / WEIGHT_STEP_KG) * WEIGHT_STEP_KG,
+            np.floor(top * DELOAD_FACTOR / WEIGHT_STEP_KG) * WEIGHT_STEP_KG,
+        ],
+        default=top,
+    )
+    target_reps = np.select(
+        [bodyweight, progress | deload],
+        [achieved + 1, rep_low],
+        default=np.minimum(achieved + 1, rep_high),
+    )
+
+    return {
+        "user_id": planned["user_id"][found],
+        "exercise_id": planned["exercise_id"][found],
+        "target_weight_kg": np.maximum(target_weight, 0.0),
+        "target_reps": target_reps.astype(np.int64),
+        "estimated_1rm_kg": np.round(estimated_1rm[index], 2),
+        "last_day": last_day[index],
+    }
+
+
+async def load_log_columns(db, since: date) -> Dict[str, np.ndarray]:
+    """Streams the logs since `since` into NumPy columns, one chunk of rows at a time."""
+    chunks: Dict[str, List[np.ndarray]] = {name: [] for name in ("user_id", "exercise_id", "day", "reps", "weight_kg")}
+    async for rows in crud.stream_recent_log_columns(db, since, chunk_size=CHUNK_SIZE):
+        user_ids, exercise_ids, days, reps, weights = zip(*rows)
+        chunks["user_id"].append(np.fromiter(user_ids, np.int64, len(rows)))
+        chunks["exercise_id"].append(np.fromiter(exercise_ids, np.int64, len(rows)))
+        chunks["day"].append(np.fromiter((day.toordinal() for day in days), np.int64, len(rows)))
+        chunks["reps"].append(np.fromiter(reps, np.float64, len(rows)))
+        chunks["weight_kg"].append(np.fromiter(weights, np.float64, len(rows)))
+    return {
+        name: np.concatenate(columns) if columns else np.empty(0, dtype=np.float64 if name in ("reps", "weight_kg") else np.int64)
+        for name, columns in chunks.items()
+    }
+
+
+async def load_planned_targets(db) -> Dict[str, np.ndarray]:
+    """Loads every user's planned exercises with their rep ranges; one row per (user, exercise)."""
+    targets = {}
+    for user_id, exercise_id, reps in await crud.get_planned_exercise_targets(db):
+        low, high = parse_rep_range(reps)
+        # An exercise planned on several days keeps its widest rep range
+        previous = targets.get((user_id, exercise_id))
+        if previous is not None:
+            low, high = min(low, previous[0]), max(high, previous[1])
+        targets[(user_id, exercise_id)] = (low, high)
+
+    pairs = sorted(targets)
+    return {
+        "user_id": np.array([pair[0] for pair in pairs], dtype=np.int64),
+        "exercise_id": np.array([pair[1] for pair in pairs], dtype=np.int64),
+        "rep_low": np.array([targets[pair][0] for pair in pairs], dtype=np.float64),
+        "rep_high": np.array([targets[pair][1] for pair in pairs], dtype=np.float64),
+    }
+
+
+async def run(lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+    started = time.perf_counter()
+    async with database.SessionLocal() as db:
+        logs = await load_log_columns(db, date.today() - timedelta(days=lookback_days))
+        planned = await load_planned_targets(db)
+        loaded = time.perf_counter()
+
+        result = compute_recommendations(logs, planned)
+        computed = time.perf_counter()
+
+        recommendations = [
+            {
+                "user_id": user_id, "exercise_id": exercise_id, "target_weight_kg": weight, "target_reps": reps,
+                "estimated_1rm_kg": estimated_1rm, "last_session_date": date.fromordinal(day),
+            }
+            for user_id, exercise_id, weight, reps, estimated_1rm, day in zip(
+                result["user_id"].tolist(), result["exercise_id"].tolist(), result["target_weight_kg"].tolist(),
+                result["target_reps"].tolist(), result["estimated_1rm_kg"].tolist(), result["last_day"].tolist(),
+            )
+        ]
+        await crud.replace_exercise_recommendations(db, recommendations)
+
+    # Cached plan documents embed the recommendations. Only a shared cache can be reached
+    # from this process; the API's in-memory caches pick them up as their entries expire.
+    if cache.plan_cache.shared:
+        for user_id in np.unique(planned["user_id"]).tolist():
+            await cache.plan_cache.invalidate(user_id)
+    else:
+        print(f"Plans cached by the API show the new recommendations within {cache.plan_cache.ttl_seconds}s")
+
+    print(
+        f"Wrote {len(recommendations)} recommendations from {len(logs['user_id'])} logged sets "
+        f"(load {loaded - started:.1f}s, compute {computed - loaded:.1f}s, total {time.perf_counter() - started:.1f}s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute progressive-overload targets for every planned exercise.")
+    parser.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS, help="Days of log history to consider.")
+    args = parser.parse_args()
+
+    async def run_job():
+        try:
+            await run(args.lookback_days)
+        finally:
+            await database.engine.dispose()
+
+    asyncio.run(run_job())
+
+
+if __name__ == "__main__":
+    main()
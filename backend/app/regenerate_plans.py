@@ -0,0 +1,164 @@
+"""
+Batch job that rebuilds workout plans for a cohort of users.
+
+Run it after changing the splits in WorkoutGenerator or the exercise library:
+
+    python -m app.regenerate_plans --all
+    python -m app.regenerate_plans --user-ids 1 2 3 --checkpoint plans.ckpt
+
+Users are processed in ascending ID order by concurrent workers, each with its
+own session, capped at the size of the engine's connection pool. Progress is
+checkpointed as a low watermark (every user at or below it is done) so a
+crashed run resumes where it left off.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+from . import crud, database, workout_generator
+
+DEFAULT_POOL_SIZE = 5
+PAGE_SIZE = 1000
+CHECKPOINT_EVERY = 500
+
+
+def _pool_size() -> int:
+    """Returns the number of pooled connections the engine keeps open."""
+    size = getattr(database.engine.pool, "size", None)
+    return size() if callable(size) else DEFAULT_POOL_SIZE
+
+
+def _load_checkpoint(path: Optional[str]) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"last_user_id": 0, "processed": 0, "failed": []}
+
+
+def _save_checkpoint(path: Optional[str], checkpoint: dict):
+    if not path:
+        return
+    # Write to a temporary file first so a crash never leaves a torn checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+async def _iter_user_ids(user_ids: Optional[List[int]], after_id: int) -> AsyncIterator[int]:
+    """Yields the user IDs still to process, in ascending order."""
+    if user_ids is not None:
+        for user_id in sorted(set(user_ids)):
+            if user_id > after_id:
+                yield user_id
+        return
+
+    while True:
+        async with database.SessionLocal() as db:
+            page = await crud.get_planned_user_ids(db, after_id=after_id, limit=PAGE_SIZE)
+        if not page:
+            return
+        for user_id in page:
+            yield user_id
+        after_id = page[-1]
+
+
+async def regenerate_plans(
+    user_ids: Optional[List[int]] = None,
+    concurrency: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+) -> dict:
+    """
+    Regenerates plans for the given user IDs, or for every user with a plan when
+    user_ids is None. Returns the final checkpoint together with run statistics.
+    """
+    pool_size = _pool_size()
+    workers = max(1, min(concurrency or pool_size, pool_size))
+    checkpoint = _load_checkpoint(checkpoint_path)
+    failed = set(checkpoint["failed"])
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    issued: deque = deque()
+    done: set = set()
+    processed_this_run = 0
+    started = time.perf_counter()
+
+    def mark_done(user_id: int):
+        nonlocal processed_this_run
+        done.add(user_id)
+        processed_this_run += 1
+        # Advance the watermark over every contiguous finished user
+        while issued and issued[0] in done:
+            checkpoint["last_user_id"] = issued.popleft()
+            done.discard(checkpoint["last_user_id"])
+        checkpoint["processed"] += 1
+        if processed_this_run % CHECKPOINT_EVERY == 0:
+            checkpoint["failed"] = sorted(failed)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - started
+            print(f"Regenerated {processed_this_run} plans ({processed_this_run / elapsed:.1f} users/sec)")
+
+    async def worker():
+        while True:
+            user_id = await queue.get()
+            if user_id is None:
+                return
+            try:
+                async with database.SessionLocal() as db:
+                    if await workout_generator.generate_and_save_plan_for_user(db, user_id):
+                        failed.discard(user_id)
+                    else:
+                        failed.add(user_id)
+            except Exception as exc:
+                print(f"Failed to regenerate plan for user_id {user_id}: {exc}")
+                failed.add(user_id)
+            mark_done(user_id)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        async for user_id in _iter_user_ids(user_ids, checkpoint["last_user_id"]):
+            issued.append(user_id)
+            await queue.put(user_id)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        checkpoint["failed"] = sorted(failed)
+        _save_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.perf_counter() - started
+    throughput = processed_this_run / elapsed if elapsed > 0 else 0.0
+    print(f"Regenerated {processed_this_run} plans in {elapsed:.1f}s ({throughput:.1f} users/sec) with {workers} workers, {len(failed)} failed")
+    return {**checkpoint, "workers": workers, "elapsed_seconds": elapsed, "users_per_second": throughput}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate workout plans for a cohort of users.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Regenerate the plan of every user that has plan details.")
+    target.add_argument("--user-ids", type=int, nargs="+", help="Regenerate plans for these user IDs only.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Number of workers, capped at the connection pool size.")
+    parser.add_argument("--checkpoint", default=None, help="Path of the checkpoint file used to resume an interrupted run.")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await regenerate_plans(
+                user_ids=None if args.all else args.user_ids,
+                concurrency=args.concurrency,
+                checkpoint_path=args.checkpoint,
+            )
+        finally:
+            await database.engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Dict
-from datetime import date
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Dict, Optional, Literal, Union, Annotated
+from datetime import date, datetime
 
 # This is the configuration that tells Pydantic to read data
 # from ORM model attributes (like plan.id, plan.user_id, etc.)
@@ -34,6 +34,36 @@ class WorkoutDayExerciseUpdate(BaseModel):
 class ExerciseChange(BaseModel):
     new_exercise_id: int
 
+# Operations of a bulk workout day edit, applied in order
+class UpdateDayExerciseOperation(BaseModel):
+    op: Literal["update"]
+    day_exercise_id: int
+    sets: int
+    reps: str
+
+class ReplaceDayExerciseOperation(BaseModel):
+    op: Literal["replace"]
+    day_exercise_id: int
+    exercise_id: int
+
+class RemoveDayExerciseOperation(BaseModel):
+    op: Literal["remove"]
+    day_exercise_id: int
+
+class AddDayExerciseOperation(BaseModel):
+    op: Literal["add"]
+    exercise_id: int
+    sets: int
+    reps: str
+
+WorkoutDayEditOperation = Annotated[
+    Union[UpdateDayExerciseOperation, ReplaceDayExerciseOperation, RemoveDayExerciseOperation, AddDayExerciseOperation],
+    Field(discriminator="op"),
+]
+
+class WorkoutDayEdit(BaseModel):
+    operations: List[WorkoutDayEditOperation]
+
 class WorkoutSessionLogCreate(BaseModel):
     user_id: int
     exercise_id: int
@@ -41,6 +71,7 @@ class WorkoutSessionLogCreate(BaseModel):
     sets: int # The set number (e.g., 1, 2, 3)
     reps: int # Actual reps performed
     weight_kg: float
+    notes: Optional[str] = None
 
 # --- Response Schemas (for reading from DB) ---
 
@@ -79,10 +110,114 @@ class WorkoutSessionLog(WorkoutSessionLogCreate):
 
 # --- Special Response Schemas ---
 
+class WorkoutSessionLogBatchResponse(BaseModel):
+    """Result of a batch set-logging request; duplicates are sets that were already logged."""
+    created: List[WorkoutSessionLog]
+    duplicates: List[WorkoutSessionLog]
+
+class ExerciseRecommendation(BaseModel):
+    """Next session's target for a planned exercise, progressed from the last logged session."""
+    exercise_id: int
+    target_weight_kg: float
+    target_reps: int
+    estimated_1rm_kg: float
+    last_session_date: date
+    model_config = model_config
+
 class WorkoutPlanResponse(BaseModel):
     """A custom schema for the main plan response to the frontend."""
     plan_details: WorkoutPlan
     weekly_schedule: Dict[str, WorkoutDay]
+    recommendations: Dict[int, ExerciseRecommendation] = {} # Keyed by exercise_id
+
+class PlanGenerationJob(BaseModel):
+    """Status of a background plan generation job; poll it until status is done or failed."""
+    id: str
+    user_id: int
+    status: Literal["pending", "running", "done", "failed"]
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    model_config = model_config
+
+class WorkoutPlanJobResponse(BaseModel):
+    """The saved plan details plus the job that generates the weekly schedule."""
+    plan_details: WorkoutPlan
+    job: PlanGenerationJob
+
+class PlanPreviewRequest(BaseModel):
+    sessions_per_week: int = Field(ge=1, le=7)
+    goal: int
+    seed: Optional[int] = None # Same seed and inputs give the same plan
+
+class PlanPreviewExercise(BaseModel):
+    exercise_id: int
+    sets: int
+    reps: str
+    exercise: Exercise
+    model_config = model_config
+
+class PlanPreviewResponse(BaseModel):
+    """A generated weekly plan that has not been saved. Echoes the seed used to draw it."""
+    seed: int
+    weekly_schedule: Dict[str, List[PlanPreviewExercise]]
+
+class WorkoutSessionLogRangeResponse(BaseModel):
+    """
+    A page of a user's logs grouped by date. Pass next_cursor back as `cursor` to get
+    the next page; a date can be split across two consecutive pages.
+    """
+    days: Dict[date, List[WorkoutSessionLog]]
+    next_cursor: Optional[str] = None
+
+class ExerciseProgressPoint(BaseModel):
+    """Training summary of one exercise over one day or week."""
+    exercise_id: int
+    period_start: date
+    set_count: int
+    total_reps: int
+    volume_kg: float
+    top_weight_kg: float
+    estimated_1rm_kg: float
+
+class NotesSearchHit(WorkoutSessionLog):
+    score: float
+
+class NotesSearchResponse(BaseModel):
+    """A page of logs ranked by how well their notes match the query; pass next_offset back as `offset`."""
+    results: List[NotesSearchHit]
+    next_offset: Optional[int] = None
+
+class MuscleGroupVolume(BaseModel):
+    muscle_group_id: int
+    muscle_group: str
+    set_count: int
+    total_reps: int
+    volume_kg: float
+
+class MuscleGroupVolumeWeek(BaseModel):
+    """One column of the volume heatmap; muscle groups without logged sets are omitted."""
+    week_start: date
+    muscle_groups: List[MuscleGroupVolume]
+
+class ExerciseSearchResult(BaseModel):
+    id: int
+    name: str
+    type: str
+    muscle_group_id: int
+    muscle_group: str
+    score: float
+
+class ExerciseSearchFacets(BaseModel):
+    types: Dict[str, int]
+    muscle_groups: Dict[int, int] # muscle_group_id -> number of matches
+
+class ExerciseSearchResponse(BaseModel):
+    """A ranked page of exercise search results; total counts every match after filtering."""
+    total: int
+    results: List[ExerciseSearchResult]
+    facets: ExerciseSearchFacets
 
 class StatusResponse(BaseModel):
     """A generic response for success/status messages."""
@@ -0,0 +1,113 @@
+"""
+Direct ORM-to-JSON serialization for API responses.
+
+Response data comes from our own database and code, so it is not validated again:
+each Serializer is compiled once from a response schema into plain functions that
+read the schema's fields straight off ORM objects (or dicts and NamedTuples), and
+the resulting document is encoded to bytes by pydantic-core's Rust serializer.
+Endpoints return the resulting Response, so FastAPI does not validate it either;
+their response_model only documents the shape in OpenAPI.
+See benchmarks/bench_serialization.py for the comparison with the classic path.
+"""
+import types
+from typing import Any, Callable, Dict, List, Optional, Union, get_args, get_origin
+
+import pydantic_core
+from fastapi import Response
+from pydantic import BaseModel
+
+from . import schemas
+
+Converter = Callable[[Any], Any]
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _to_float(value: Any) -> Any:
+    # Integer columns behind float fields (hours_per_session) keep the float encoding validation gave them
+    return None if value is None else float(value)
+
+
+def _compile(annotation: Any) -> Converter:
+    """Builds a function turning trusted data of type `annotation` into JSON-ready Python values."""
+    origin = get_origin(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _compile_model(annotation)
+    if annotation is float:
+        return _to_float
+    if origin in (list, List):
+        (item_annotation,) = get_args(annotation)
+        convert_item = _compile(item_annotation)
+        if convert_item is _identity:
+            return list
+        return lambda value: [convert_item(item) for item in value]
+    if origin in (dict, Dict):
+        _, value_annotation = get_args(annotation)
+        convert_value = _compile(value_annotation)
+        if convert_value is _identity:
+            return dict
+        return lambda value: {key: convert_value(item) for key, item in value.items()}
+    if origin in (Union, types.UnionType):
+        members = [member for member in get_args(annotation) if member is not type(None)]
+        if len(members) == 1:
+            convert_member = _compile(members[0])
+            if convert_member is _identity:
+                return _identity
+            return lambda value: None if value is None else convert_member(value)
+    return _identity
+
+
+def _compile_model(model: type) -> Converter:
+    fields = [
+        (name, _compile(field.annotation), None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    ]
+
+    def convert(value: Any) -> Dict[str, Any]:
+        if isinstance(value, dict):
+            return {name: convert_field(value.get(name, default)) for name, convert_field, default in fields}
+        return {name: convert_field(getattr(value, name, default)) for name, convert_field, default in fields}
+
+    return convert
+
+
+class Serializer:
+    """Serializes trusted data in the shape of a response schema, such as List[schemas.Exercise]."""
+
+    def __init__(self, annotation: Any):
+        self.annotation = annotation
+        self.convert = _compile(annotation)
+
+    def to_json(self, data: Any) -> bytes:
+        return pydantic_core.to_json(self.convert(data))
+
+
+EXERCISE_LIST = Serializer(List[schemas.Exercise])
+TEMPLATE_LIST = Serializer(List[schemas.WorkoutTemplate])
+USER = Serializer(schemas.User)
+WORKOUT_PLAN = Serializer(schemas.WorkoutPlanResponse)
+WORKOUT_PLAN_JOB = Serializer(schemas.WorkoutPlanJobResponse)
+PLAN_GENERATION_JOB = Serializer(schemas.PlanGenerationJob)
+PLAN_PREVIEW = Serializer(schemas.PlanPreviewResponse)
+WORKOUT_DAY = Serializer(schemas.WorkoutDay)
+WORKOUT_DAY_EXERCISE = Serializer(schemas.WorkoutDayExercise)
+WORKOUT_DAY_EXERCISE_LIST = Serializer(List[schemas.WorkoutDayExercise])
+SESSION_LOG = Serializer(schemas.WorkoutSessionLog)
+SESSION_LOG_LIST = Serializer(List[schemas.WorkoutSessionLog])
+SESSION_LOG_RANGE = Serializer(schemas.WorkoutSessionLogRangeResponse)
+SESSION_LOG_BATCH = Serializer(schemas.WorkoutSessionLogBatchResponse)
+NOTES_SEARCH = Serializer(schemas.NotesSearchResponse)
+PROGRESS_POINTS = Serializer(List[schemas.ExerciseProgressPoint])
+VOLUME_WEEKS = Serializer(List[schemas.MuscleGroupVolumeWeek])
+EXERCISE_SEARCH = Serializer(schemas.ExerciseSearchResponse)
+
+
+def to_json(serializer: Serializer, data: Any) -> bytes:
+    """Serializes ORM objects, or plain containers of them, straight to JSON bytes."""
+    return serializer.to_json(data)
+
+
+def json_response(serializer: Serializer, data: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=to_json(serializer, data), status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,94 @@
+"""
+Production entry point: several uvicorn worker processes sharing one port.
+
+The database is prepared once here, in the parent, before the workers start, so they
+skip schema creation and seeding. Each worker gets an equal share of the connection
+budget as its pool size, so adding workers never exceeds the database's limit.
+
+    python -m app.serve --workers 4 --max-db-connections 80
+
+Defaults come from WEB_CONCURRENCY and DB_MAX_CONNECTIONS. Explicit DB_POOL_SIZE /
+DB_MAX_OVERFLOW settings are left alone.
+
+Workers share no memory, so more than one needs the state they must agree on kept
+outside them:
+
+- Postgres: plan job status is in the database either way, but on other databases
+  notes search uses an in-process index that other workers would not keep current;
+- PLAN_CACHE_REDIS_URL: plan edits handled by one worker must drop the document
+  another worker cached, and read-your-writes must know about writes to any worker.
+
+Without both, the number of workers defaults to 1 and more are refused. With them it
+defaults to the number of CPUs. With LOG_WRITE_MODE=buffered, a set buffered by one
+worker is seen by the others once it is flushed, LOG_FLUSH_INTERVAL_MS later.
+"""
+import argparse
+import asyncio
+import os
+
+import uvicorn
+
+
+def multi_worker_problems() -> list:
+    """Why several workers would serve inconsistent data here; empty when they would not."""
+    problems = []
+    # database.py connects to Postgres when DATABASE_URL is unset
+    if not os.getenv("DATABASE_URL", "postgresql").startswith("postgresql"):
+        problems.append("the database is not Postgres, so notes search indexes are per process")
+    if not os.getenv("PLAN_CACHE_REDIS_URL"):
+        problems.append("PLAN_CACHE_REDIS_URL is not set, so plan caches and read-your-writes are per process")
+    return problems
+
+
+def pool_settings(max_connections: int, workers: int) -> dict:
+    """Splits a connection budget into a per-worker pool size and overflow."""
+    per_worker = max(2, max_connections // workers)
+    pool_size = max(1, per_worker // 2)
+    return {"DB_POOL_SIZE": str(pool_size), "DB_MAX_OVERFLOW": str(per_worker - pool_size)}
+
+
+async def prepare():
+    # Imported here so the database settings above are in place before the engine is created
+    from . import bootstrap, database
+    try:
+        await bootstrap.prepare_database()
+    finally:
+        await database.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with multiple worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    problems = multi_worker_problems()
+    default_workers = 1 if problems else os.cpu_count() or 1
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", default_workers)))
+    parser.add_argument(
+        "--max-db-connections", type=int, default=int(os.getenv("DB_MAX_CONNECTIONS", "80")),
+        help="Connections all workers may open together, per database.",
+    )
+    args = parser.parse_args()
+    if args.workers > 1 and problems:
+        parser.error(f"cannot run {args.workers} workers: " + "; ".join(problems))
+
+    for variable, value in pool_settings(args.max_db_connections, args.workers).items():
+        os.environ.setdefault(variable, value)
+    print(f"Starting {args.workers} workers with pool_size={os.environ['DB_POOL_SIZE']} "
+          f"max_overflow={os.environ['DB_MAX_OVERFLOW']} each")
+
+    asyncio.run(prepare())
+    from . import bootstrap
+    os.environ[bootstrap.PREPARED_ENV] = "1"
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,189 @@
 import random
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from . import crud, schemas, models
+from . import cache, crud, schemas, models
+
+class DayLayout(NamedTuple):
+    day_of_week: str
+    muscle_groups: tuple[str, ...]
+    exercise_count: int # 0 for rest days
+
+class PlanLayout(NamedTuple):
+    days: tuple[DayLayout, ...]
+    sets: int
+    reps: str
+
+class PoolExercise(NamedTuple):
+    """An exercise of the cached pool, detached from any session so it can be shared safely."""
+    id: int
+    name: str
+    type: str
+    muscle_group: str
+
+ExercisePool = Mapping[str, tuple[PoolExercise, ...]]
+
+def get_set_rep_scheme(goal: int) -> tuple[int, str]:
+    """Determines the number of sets and reps based on the user's goal."""
+    if goal <= 3:  # Endurance
+        return 3, "12-15"
+    elif goal <= 6:  # Hypertrophy (Muscle Growth)
+        return 4, "8-12"
+    else:  # Strength
+        return 5, "4-6"
+
+@lru_cache(maxsize=256)
+def get_plan_layout(sessions_per_week: int, goal: int) -> PlanLayout:
+    """Returns the weekly split and set/rep scheme. Layouts are immutable and memoized."""
+
+    # Define standard muscle group splits
+    push_groups = ("Chest", "Shoulders", "Triceps")
+    pull_groups = ("Back", "Biceps")
+    leg_groups = ("Legs", "Abs")
+    full_body_groups = ("Chest", "Back", "Legs", "Shoulders")
+    upper_body_groups = ("Chest", "Back", "Shoulders", "Biceps", "Triceps")
+    
+    # --- THE FIX IS HERE: Separated logic for 6, 5, 4, and 3 days ---
+
+    if sessions_per_week >= 6: # Push/Pull/Legs x2
+        days = (
+            ("Monday", push_groups, 5),
+            ("Tuesday", pull_groups, 5),
+            ("Wednesday", leg_groups, 5),
+            ("Thursday", push_groups, 5),
+            ("Friday", pull_groups, 5),
+            ("Saturday", leg_groups, 5),
+            ("Sunday", (), 0), # Rest Day
+        )
+
+    elif sessions_per_week == 5: # Push/Pull/Legs/Upper/Lower
+        days = (
+            ("Monday", push_groups, 6),
+            ("Tuesday", pull_groups, 5),
+            ("Wednesday", leg_groups, 5),
+            ("Thursday", (), 0), # Rest Day
+            ("Friday", upper_body_groups, 5),
+            ("Saturday", leg_groups, 5),
+            ("Sunday", (), 0), # Rest Day
+        )
+
+    elif sessions_per_week == 4: # Upper/Lower Split
+        days = (
+            ("Monday", upper_body_groups, 6),
+            ("Tuesday", leg_groups, 5),
+            ("Wednesday", (), 0), # Rest Day
+            ("Thursday", upper_body_groups, 6),
+            ("Friday", leg_groups, 5),
+            ("Saturday", (), 0), # Rest Day
+            ("Sunday", (), 0), # Rest Day
+        )
+
+    elif sessions_per_week == 3: # Full Body Split
+        days = (
+            ("Monday", full_body_groups, 5),
+            ("Tuesday", (), 0), # Rest Day
+            ("Wednesday", full_body_groups, 5),
+            ("Thursday", (), 0), # Rest Day
+            ("Friday", full_body_groups, 5),
+            ("Saturday", (), 0), # Rest Day
+            ("Sunday", (), 0), # Rest Day
+        )
+    
+    else: # Fallback for 1-2 days
+        days = (
+            ("Monday", full_body_groups, 5),
+            ("Tuesday", (), 0),
+            ("Wednesday", full_body_groups, 5),
+            ("Thursday", (), 0),
+            ("Friday", (), 0),
+            ("Saturday", (), 0),
+            ("Sunday", (), 0),
+        )
+
+    sets, reps = get_set_rep_scheme(goal)
+    return PlanLayout(days=tuple(DayLayout(*day) for day in days), sets=sets, reps=reps)
+
+def pick_exercises(exercise_pool: ExercisePool, muscle_groups: tuple[str, ...], count: int, rng: random.Random) -> list[PoolExercise]:
+    """Picks a specified number of random exercises for a list of muscle groups from the preloaded pool."""
+    exercises = [exercise for group in muscle_groups for exercise in exercise_pool.get(group, ())]
+    # Ensure we don't try to sample more exercises than exist
+    return rng.sample(exercises, min(len(exercises), count))
+
+def build_weekly_plan(
+    exercise_pool: ExercisePool, sessions_per_week: int, goal: int, rng: random.Random
+) -> list[tuple[str, list[PoolExercise]]]:
+    """
+    Pure plan design: samples exercises for every day of the week from an in-memory pool.
+    Touches no database, so it serves both generation and previews.
+    """
+    layout = get_plan_layout(sessions_per_week, goal)
+    return [
+        (day.day_of_week, pick_exercises(exercise_pool, day.muscle_groups, day.exercise_count, rng) if day.muscle_groups else [])
+        for day in layout.days
+    ]
+
+_exercise_pool: Optional[tuple[int, ExercisePool]] = None
+
+async def get_exercise_pool(db: AsyncSession) -> ExercisePool:
+    """
+    Returns the exercise library grouped by muscle group, reloaded only after library changes.
+    The pool is shared by every request, so it holds read-only rows rather than ORM objects.
+    """
+    global _exercise_pool
+    generation = cache.library_cache.generation
+    if _exercise_pool is None or _exercise_pool[0] != generation:
+        pool = await crud.get_exercise_pool_by_muscle_group(db)
+        _exercise_pool = (generation, MappingProxyType({
+            group_name: tuple(PoolExercise(exercise.id, exercise.name, exercise.type, group_name) for exercise in exercises)
+            for group_name, exercises in pool.items()
+        }))
+    return _exercise_pool[1]
 
 class WorkoutGenerator:
     """
     Generates a personalized workout plan based on user goals and schedule.
     The generated plan is then saved to the database.
     """
-    def __init__(self, db: AsyncSession, user_plan: models.WorkoutPlan, user_goal: int):
+    def __init__(self, db: AsyncSession, user_plan: models.WorkoutPlan, user_goal: int, rng: random.Random | None = None):
         self.db = db
         self.plan = user_plan
         self.user_id = user_plan.user_id
         self.sessions_per_week = user_plan.sessions_per_week
         self.goal = user_goal
-        self.sets, self.reps = self._get_set_rep_scheme()
-
-    def _get_set_rep_scheme(self):
-        """Determines the number of sets and reps based on the user's goal."""
-        if self.goal <= 3:  # Endurance
-            return 3, "12-15"
-        elif self.goal <= 6:  # Hypertrophy (Muscle Growth)
-            return 4, "8-12"
-        else:  # Strength
-            return 5, "4-6"
-
-    async def _get_exercises_for_groups(self, muscle_groups: list[str], count: int) -> list[models.Exercise]:
-        """Fetches a specified number of random exercises for a list of muscle groups."""
-        exercises = await crud.get_exercises_by_muscle_groups(self.db, muscle_groups)
-        # Ensure we don't try to sample more exercises than exist
-        return random.sample(exercises, min(len(exercises), count))
-
-    async def _create_and_save_day(self, day_of_week: str, muscle_groups: list[str], exercise_count: int):
-        """Creates a workout day, populates it with exercises, and saves it to the DB."""
-        workout_day = await crud.create_workout_day(self.db, user_id=self.user_id, day_of_week=day_of_week)
-        if not muscle_groups: # Handle rest days
-            return
-        
-        exercises = await self._get_exercises_for_groups(muscle_groups, exercise_count)
-        for exercise in exercises:
-            exercise_data = schemas.WorkoutDayExerciseCreate(exercise_id=exercise.id, sets=self.sets, reps=self.reps)
-            await crud.add_exercise_to_workout_day(self.db, workout_day.id, exercise_data)
+        self.rng = rng or random.Random()
+        self.sets, self.reps = get_set_rep_scheme(self.goal)
 
     async def generate_and_save_plan(self):
-        """Main logic to generate and save the entire weekly plan."""
-        
-        # Clear any pre-existing plan for the user to prevent duplicates
-        await crud.delete_workout_days_for_user(self.db, self.user_id)
-
-        # Define standard muscle group splits
-        push_groups = ["Chest", "Shoulders", "Triceps"]
-        pull_groups = ["Back", "Biceps"]
-        leg_groups = ["Legs", "Abs"]
-        full_body_groups = ["Chest", "Back", "Legs", "Shoulders"]
-        upper_body_groups = ["Chest", "Back", "Shoulders", "Biceps", "Triceps"]
-        
-        # --- THE FIX IS HERE: Separated logic for 6, 5, 4, and 3 days ---
-
-        if self.sessions_per_week >= 6: # Push/Pull/Legs x2
-            await self._create_and_save_day("Monday", push_groups, 5)
-            await self._create_and_save_day("Tuesday", pull_groups, 5)
-            await self._create_and_save_day("Wednesday", leg_groups, 5)
-            await self._create_and_save_day("Thursday", push_groups, 5)
-            await self._create_and_save_day("Friday", pull_groups, 5)
-            await self._create_and_save_day("Saturday", leg_groups, 5)
-            await self._create_and_save_day("Sunday", [], 0) # Rest Day
-
-        elif self.sessions_per_week == 5: # Push/Pull/Legs/Upper/Lower
-            await self._create_and_save_day("Monday", push_groups, 6)
-            await self._create_and_save_day("Tuesday", pull_groups, 5)
-            await self._create_and_save_day("Wednesday", leg_groups, 5)
-            await self._create_and_save_day("Thursday", [], 0) # Rest Day
-            await self._create_and_save_day("Friday", upper_body_groups, 5)
-            await self._create_and_save_day("Saturday", leg_groups, 5)
-            await self._create_and_save_day("Sunday", [], 0) # Rest Day
-
-        elif self.sessions_per_week == 4: # Upper/Lower Split
-            await self._create_and_save_day("Monday", upper_body_groups, 6)
-            await self._create_and_save_day("Tuesday", leg_groups, 5)
-            await self._create_and_save_day("Wednesday", [], 0) # Rest Day
-            await self._create_and_save_day("Thursday", upper_body_groups, 6)
-            await self._create_and_save_day("Friday", leg_groups, 5)
-            await self._create_and_save_day("Saturday", [], 0) # Rest Day
-            await self._create_and_save_day("Sunday", [], 0) # Rest Day
-
-        elif self.sessions_per_week == 3: # Full Body Split
-            await self._create_and_save_day("Monday", full_body_groups, 5)
-            await self._create_and_save_day("Tuesday", [], 0) # Rest Day
-            await self._create_and_save_day("Wednesday", full_body_groups, 5)
-            await self._create_and_save_day("Thursday", [], 0) # Rest Day
-            await self._create_and_save_day("Friday", full_body_groups, 5)
-            await self._create_and_save_day("Saturday", [], 0) # Rest Day
-            await self._create_and_save_day("Sunday", [], 0) # Rest Day
-        
-        else: # Fallback for 1-2 days
-            await self._create_and_save_day("Monday", full_body_groups, 5)
-            await self._create_and_save_day("Tuesday", [], 0)
-            await self._create_and_save_day("Wednesday", full_body_groups, 5)
-            await self._create_and_save_day("Thursday", [], 0)
-            await self._create_and_save_day("Friday", [], 0)
-            await self._create_and_save_day("Saturday", [], 0)
-            await self._create_and_save_day("Sunday", [], 0)
-
-
-async def generate_and_save_plan_for_user(db: AsyncSession, user_id: int):
+        """
+        Main logic to generate and save the entire weekly plan.
+        The week is built in memory from the cached exercise pool and then written
+        in a single transaction that also clears any pre-existing plan.
+        """
+        exercise_pool = await get_exercise_pool(self.db)
+        days = [
+            (day_of_week, [
+                schemas.WorkoutDayExerciseCreate(exercise_id=exercise.id, sets=self.sets, reps=self.reps)
+                for exercise in exercises
+            ])
+            for day_of_week, exercises in build_weekly_plan(exercise_pool, self.sessions_per_week, self.goal, self.rng)
+        ]
+        await crud.replace_workout_days_for_user(self.db, self.user_id, days)
+
+
+async def generate_and_save_plan_for_user(db: AsyncSession, user_id: int) -> bool:
     """
     Entry point function to generate a plan for a specific user.
+    Returns False when the user or their plan details could not be found.
     """
     user = await crud.get_user(db, user_id)
     plan = await crud.get_workout_plan_by_user(db, user_id)
 
     if not user or not plan:
         print(f"Could not find user or plan details for user_id: {user_id}")
-        return
+        return False
 
     generator = WorkoutGenerator(db, plan, user.goal)
     await generator.generate_and_save_plan()
     print(f"Successfully generated and saved workout plan for user_id: {user_id}")
+    return True
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of response serialization on realistic plan and log payloads.
+
+Compares the classic FastAPI path (validate the ORM objects into the response model,
+dump them to a Python dict, encode with the stdlib json module) with the direct path in
+app.serialization (read the fields off the ORM objects without validation, Rust JSON encoding).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization
+"""
+import json
+import timeit
+from datetime import date, timedelta
+
+from pydantic import TypeAdapter
+
+from app import models, serialization
+
+
+def build_plan():
+    """A 6-day push/pull/legs plan as transient ORM objects, like crud returns them."""
+    exercises = [models.Exercise(id=i, name=f"Exercise {i}", type="Compound", muscle_group_id=i % 8 + 1) for i in range(1, 33)]
+    plan_details = models.WorkoutPlan(id=1, workout_type="gym", sessions_per_week=6, hours_per_session=1, user_id=1)
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    weekly_schedule = {}
+    for day_index, day_of_week in enumerate(days):
+        day = models.WorkoutDay(id=day_index + 1, user_id=1, day_of_week=day_of_week)
+        count = 0 if day_of_week == "Sunday" else 5
+        day.exercises = [
+            models.WorkoutDayExercise(
+                id=day_index * 10 + n, workout_day_id=day.id, exercise_id=exercises[(day_index * 5 + n) % 32].id,
+                sets=4, reps="8-12", exercise=exercises[(day_index * 5 + n) % 32],
+            )
+            for n in range(count)
+        ]
+        weekly_schedule[day_of_week] = day
+    return {"plan_details": plan_details, "weekly_schedule": weekly_schedule}
+
+
+def build_logs(count):
+    """`count` logged sets spread over consecutive days, four exercises of three sets a day."""
+    start = date(2026, 1, 1)
+    return [
+        models.WorkoutSessionLog(
+            id=i + 1, user_id=1, exercise_id=i // 3 % 4 + 1, date=start + timedelta(days=i // 12),
+            sets=i % 3 + 1, reps=10, weight_kg=60.0 + i % 5 * 2.5,
+        )
+        for i in range(count)
+    ]
+
+
+def classic_path(adapter, data):
+    value = adapter.validate_python(data, from_attributes=True)
+    return json.dumps(adapter.dump_python(value, mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def direct_path(serializer, data):
+    return serialization.to_json(serializer, data)
+
+
+def main():
+    plan = build_plan()
+    payloads = {
+        "plan (7 days, 30 exercises)": (serialization.WORKOUT_PLAN, plan),
+        "logs for one day (30 sets)": (serialization.SESSION_LOG_LIST, build_logs(30)),
+        "log range (2000 sets)": (serialization.SESSION_LOG_LIST, build_logs(2000)),
+    }
+
+    print(f"{'payload':<30} {'classic us/op':>14} {'direct us/op':>14} {'speedup':>8}")
+    for name, (serializer, data) in payloads.items():
+        adapter = TypeAdapter(serializer.annotation)
+        assert json.loads(classic_path(adapter, data)) == json.loads(direct_path(serializer, data))
+        number = max(10, 20000 // (len(data) if isinstance(data, list) else 30))
+        classic = min(timeit.repeat(lambda: classic_path(adapter, data), number=number, repeat=5)) / number
+        direct = min(timeit.repeat(lambda: direct_path(serializer, data), number=number, repeat=5)) / number
+        print(f"{name:<30} {classic * 1e6:>14.1f} {direct * 1e6:>14.1f} {classic / direct:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
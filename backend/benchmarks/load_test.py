@@ -0,0 +1,204 @@
+"""
+Reproducible HTTP load test of the FastAPI app against a local database.
+
+The app runs in-process behind httpx's ASGI transport, backed by a throwaway SQLite
+file (or any DATABASE_URL you pass, e.g. an ephemeral Postgres). Synthetic users,
+plans and logs are preloaded from a fixed seed, then concurrent clients drive a
+weighted mix of plan reads, set logging, template swaps and exercise-library
+fetches. Per-route p50/p95/p99 latency and throughput are written as JSON so two
+runs can be diffed.
+
+Run from the backend directory (needs the packages in benchmarks/requirements.txt):
+
+    python -m benchmarks.load_test --users 200 --requests 5000 --concurrency 32 --output run.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+DEFAULT_MIX = "plan_read=60,log_set=25,exercises=10,template_swap=5"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {"plan_read", "log_set", "exercises", "template_swap"}
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def preload(app_modules, users: int, log_days: int, rng: random.Random) -> dict:
+    """Creates users with generated plans and a history of logged sets; returns their day IDs."""
+    crud, database, schemas, workout_generator = app_modules
+    today = date.today()
+    plan_days = {}
+    async with database.SessionLocal() as db:
+        exercises = await crud.get_all_exercises(db)
+        exercise_ids = [exercise.id for exercise in exercises]
+        for index in range(users):
+            user = await crud.create_user(db, schemas.UserCreate(
+                username=f"load-user-{index}", age=rng.randint(18, 60), height_cm=rng.randint(155, 200),
+                weight_kg=rng.uniform(55, 110), gender=rng.choice(["male", "female"]),
+                body_type=rng.randint(1, 3), goal=rng.randint(1, 9),
+            ))
+            await crud.create_workout_plan(db, user.id, schemas.WorkoutPlanCreate(
+                workout_type="gym", sessions_per_week=rng.randint(3, 6), hours_per_session=1,
+            ))
+            # The generator reports every plan on stdout; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                await workout_generator.generate_and_save_plan_for_user(db, user.id)
+            days = await crud.get_workout_days_for_user(db, user.id)
+            plan_days[user.id] = [day.id for day in days]
+
+            logs = [
+                schemas.WorkoutSessionLogCreate(
+                    user_id=user.id, exercise_id=exercise_id, date=today - timedelta(days=day_offset),
+                    sets=set_number, reps=rng.randint(5, 12), weight_kg=rng.choice(range(20, 140, 5)),
+                )
+                for day_offset in range(1, log_days + 1, 2)
+                for exercise_id in rng.sample(exercise_ids, 4)
+                for set_number in (1, 2, 3)
+            ]
+            if logs:
+                await crud.create_workout_session_logs_batch(db, logs)
+    return {"plan_days": plan_days, "exercise_ids": exercise_ids}
+
+
+async def run_load(client, fixtures: dict, args, rng: random.Random) -> dict:
+    weights = parse_mix(args.mix)
+    operations = list(weights)
+    op_weights = [weights[name] for name in operations]
+    user_ids = list(fixtures["plan_days"])
+    today = date.today().isoformat()
+    results: dict = {}
+    remaining = args.requests
+    set_counter = 0
+
+    def record(route: str, elapsed: float, status: int):
+        entry = results.setdefault(route, {"latencies": [], "errors": 0})
+        entry["latencies"].append(elapsed)
+        if status >= 400:
+            entry["errors"] += 1
+
+    async def request(route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        record(route, time.perf_counter() - start, response.status_code)
+
+    async def client_loop():
+        nonlocal remaining, set_counter
+        while remaining > 0:
+            remaining -= 1
+            operation = rng.choices(operations, op_weights)[0]
+            user_id = rng.choice(user_ids)
+            if operation == "plan_read":
+                await request("GET /api/users/{user_id}/plan/", "GET", f"/api/users/{user_id}/plan/")
+            elif operation == "log_set":
+                set_counter += 1
+                await request("POST /api/logs/session", "POST", "/api/logs/session", json={
+                    "user_id": user_id, "exercise_id": rng.choice(fixtures["exercise_ids"]), "date": today,
+                    "sets": set_counter, "reps": rng.randint(5, 12), "weight_kg": rng.choice(range(20, 140, 5)),
+                })
+            elif operation == "exercises":
+                await request("GET /api/exercises/", "GET", "/api/exercises/")
+            elif operation == "template_swap":
+                day_id = rng.choice(fixtures["plan_days"][user_id])
+                await request("PUT /api/workout-day/{day_id}/swap-template", "PUT", f"/api/workout-day/{day_id}/swap-template", json={
+                    "template_id": rng.randint(1, 5), "user_id": user_id,
+                })
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    duration = time.perf_counter() - started
+
+    routes = {}
+    for route, entry in sorted(results.items()):
+        latencies = sorted(entry["latencies"])
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": entry["errors"],
+            "throughput_rps": len(latencies) / duration,
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {"duration_seconds": duration, "throughput_rps": total / duration, "routes": routes}
+
+
+async def main_async(args) -> dict:
+    # DATABASE_URL must be set before the app creates its engine
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import httpx
+    from app import crud, database, schemas, workout_generator
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    async with app.router.lifespan_context(app):
+        preload_started = time.perf_counter()
+        fixtures = await preload((crud, database, schemas, workout_generator), args.users, args.log_days, rng)
+        print(f"Preloaded {args.users} users in {time.perf_counter() - preload_started:.1f}s")
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            report = await run_load(client, fixtures, args, rng)
+    await database.engine.dispose()
+
+    report["config"] = {
+        "users": args.users, "log_days": args.log_days, "requests": args.requests,
+        "concurrency": args.concurrency, "mix": parse_mix(args.mix), "seed": args.seed,
+        "database": args.database_url.split("://")[0],
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API against a local database.")
+    parser.add_argument("--users", type=int, default=100, help="Synthetic users to preload.")
+    parser.add_argument("--log-days", type=int, default=28, help="Days of log history per user.")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests to send.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operation mix (default: {DEFAULT_MIX}).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for synthetic data and request order.")
+    parser.add_argument("--database-url", default=None, help="Database to use; defaults to a fresh SQLite file.")
+    parser.add_argument("--output", default="load_test_results.json", help="Where to write the JSON report.")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.database_url is None:
+            args.database_url = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'loadtest.db')}"
+        report = asyncio.run(main_async(args))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{'route':<48} {'reqs':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for route, stats in report["routes"].items():
+        print(f"{route:<48} {stats['requests']:>6} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+              f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['errors']:>6}")
+    print(f"Total throughput {report['throughput_rps']:.1f} req/s; report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Test setup: the app runs against a throwaway SQLite database, seeded on startup.
+
+The environment is configured before `app` is imported, since its modules read their
+settings at import time.
+"""
+import itertools
+import os
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+_workdir = tempfile.mkdtemp(prefix="fitify-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_workdir, 'fitify.db')}"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_workdir, "log-archive")
+for variable in ("READ_DATABASE_URL", "PLAN_CACHE_REDIS_URL", "LOG_WRITE_MODE", "PROFILE_TOKEN", "PROFILE_SAMPLE_RATE"):
+    os.environ.pop(variable, None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import cache, log_archive
+from app.main import app
+
+_usernames = itertools.count()
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio client, covering the commands the app uses."""
+    def __init__(self):
+        self.entries: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value, expires_at = self.entries.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None, px: Optional[int] = None):
+        ttl = ex if ex is not None else px / 1000 if px is not None else None
+        self.entries[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def exists(self, key: str) -> int:
+        return int(await self.get(key) is not None)
+
+    async def delete(self, key: str):
+        return int(self.entries.pop(key, None) is not None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def redis_plan_cache(monkeypatch):
+    """Points the plan cache at a fresh FakeRedis, as with PLAN_CACHE_REDIS_URL set."""
+    backend = FakeRedis()
+    monkeypatch.setattr(cache.plan_cache, "backend", backend)
+    return backend
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    """An empty log archive, so a test can archive months without affecting the others."""
+    monkeypatch.setattr(log_archive, "archive", log_archive.LogArchive(str(tmp_path / "log-archive")))
+    return log_archive.archive
+
+
+def create_user(client, goal: int = 5) -> dict:
+    response = client.post("/api/users/", json={
+        "username": f"test-user-{next(_usernames)}", "age": 30, "height_cm": 180,
+        "weight_kg": 80, "gender": "m", "body_type": 2, "goal": goal,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def wait_for_job(client, job_id: str, timeout: float = 30) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/plan-jobs/{job_id}").json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def create_plan(client, user_id: int, sessions_per_week: int = 3) -> dict:
+    """Creates a plan and waits for its weekly schedule to be generated."""
+    response = client.post(f"/api/users/{user_id}/plan/", json={
+        "workout_type": "gym", "sessions_per_week": sessions_per_week, "hours_per_session": 1,
+    })
+    assert response.status_code == 202, response.text
+    assert wait_for_job(client, response.json()["job"]["id"])["status"] == "done"
+    return client.get(f"/api/users/{user_id}/plan/").json()
@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+
+from app import log_archive, partitions
+from conftest import create_user
+
+# Dates around the boundary of archiving everything older than 12 months
+CUTOFF = partitions.add_months(partitions.month_start(date.today()), -12)
+ARCHIVED_DAYS = [partitions.add_months(CUTOFF, -2).replace(day=20), CUTOFF - timedelta(days=1)]
+KEPT_DAYS = [CUTOFF, CUTOFF.replace(day=5)]
+
+
+def log_set(user_id: int, day: date, sets: int = 1, notes=None) -> dict:
+    return {"user_id": user_id, "exercise_id": 1, "date": day.isoformat(), "sets": sets, "reps": 8, "weight_kg": 60, "notes": notes}
+
+
+def logged_days(response: dict) -> list:
+    return [(day, log["sets"]) for day, logs in response["days"].items() for log in logs]
+
+
+def test_range_reads_span_the_archive_boundary(client, archive_dir):
+    user_id = create_user(client)["id"]
+    other_id = create_user(client)["id"]
+    days = ARCHIVED_DAYS + KEPT_DAYS
+    sets = [log_set(user_id, day, sets) for day in days for sets in (1, 2)]
+    assert client.post("/api/logs/session/batch", json=sets + [log_set(other_id, ARCHIVED_DAYS[0], notes="ünïcode")]).status_code == 200
+
+    client.portal.call(partitions.archive_old_months, 12)
+    assert archive_dir.archived_before() == CUTOFF
+    assert archive_dir.months() == [partitions.month_start(ARCHIVED_DAYS[0]), partitions.month_start(ARCHIVED_DAYS[1])]
+
+    expected = [(day.isoformat(), sets) for day in days for sets in (1, 2)]
+    params = {"from": days[0].isoformat(), "to": days[-1].isoformat()}
+    assert logged_days(client.get(f"/api/logs/session/{user_id}", params=params).json()) == expected
+
+    # Pages of three cross the boundary in the middle of the second page
+    pages, cursor = [], None
+    while True:
+        page = client.get(f"/api/logs/session/{user_id}", params={**params, "limit": 3, **({"cursor": cursor} if cursor else {})}).json()
+        pages.extend(logged_days(page))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == expected
+
+    # Single days are read from whichever side holds them
+    assert len(client.get(f"/api/logs/session/{user_id}/{ARCHIVED_DAYS[1].isoformat()}").json()) == 2
+    assert len(client.get(f"/api/logs/session/{user_id}/{KEPT_DAYS[0].isoformat()}").json()) == 2
+    other = client.get(f"/api/logs/session/{other_id}/{ARCHIVED_DAYS[0].isoformat()}").json()
+    assert [log["notes"] for log in other] == ["ünïcode"]
+
+
+def test_archived_months_are_read_only_but_keep_their_rollups(client, archive_dir):
+    user_id = create_user(client)["id"]
+    client.post("/api/logs/session/batch", json=[log_set(user_id, ARCHIVED_DAYS[0]), log_set(user_id, KEPT_DAYS[0])])
+    client.portal.call(partitions.archive_old_months, 12)
+
+    assert client.post("/api/logs/session", json=log_set(user_id, ARCHIVED_DAYS[0], sets=2)).status_code == 409
+    progress = client.get(f"/api/users/{user_id}/progress", params={"period": "day"}).json()
+    assert [point["period_start"] for point in progress] == [ARCHIVED_DAYS[0].isoformat(), KEPT_DAYS[0].isoformat()]
+
+
+def test_month_file_reads_a_users_date_slice(tmp_path):
+    archive = log_archive.LogArchive(str(tmp_path))
+    month = date(2024, 2, 1)
+    rows = [
+        (1, 1, 1, date(2024, 2, 1), 1, 5, 50.0, None),
+        (2, 1, 1, date(2024, 2, 10), 1, 5, 50.0, "ok"),
+        (3, 1, 1, date(2024, 2, 29), 1, 5, 50.0, ""),
+        (4, 2, 1, date(2024, 2, 10), 1, 5, 50.0, None),
+    ]
+    assert archive.write_month(month, rows) == 4
+    logs = archive.read(1, date(2024, 2, 2), date(2024, 3, 31))
+    assert [(log.id, log.notes) for log in logs] == [(2, "ok"), (3, "")]
+    assert [log.id for log in archive.read(2, date(2024, 1, 1), date(2024, 2, 10))] == [4]
+    assert archive.read(3, date(2024, 1, 1), date(2024, 12, 31)) == []
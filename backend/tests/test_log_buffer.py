@@ -0,0 +1,62 @@
+from datetime import date
+
+from app import crud, database, log_buffer, metrics, schemas
+from conftest import create_user
+
+
+def log_set(user_id: int, sets: int, reps: int = 5) -> schemas.WorkoutSessionLogCreate:
+    return schemas.WorkoutSessionLogCreate(
+        user_id=user_id, exercise_id=1, date=date(2026, 3, 2), sets=sets, reps=reps, weight_kg=50,
+    )
+
+
+async def stored_sets(user_id: int):
+    async with database.SessionLocal() as db:
+        return sorted((log.sets, log.reps) for log in await crud.get_session_logs_by_date(db, user_id, date(2026, 3, 2)))
+
+
+def test_strict_mode_returns_stored_set_when_logged_again(client):
+    user = create_user(client)
+    payload = log_set(user["id"], sets=1).model_dump(mode="json")
+    first = client.post("/api/logs/session", json=payload).json()
+    again = client.post("/api/logs/session", json={**payload, "reps": 9}).json()
+    assert again["id"] == first["id"] and again["reps"] == 5
+
+
+def test_buffered_mode_stores_sets_like_strict_mode(client):
+    user = create_user(client)
+    buffer = log_buffer.LogWriteBuffer()
+    duplicates_before = metrics.LOG_BUFFER_DUPLICATE_ROWS._value.get()
+
+    async def scenario():
+        await buffer.add(log_set(user["id"], sets=1))
+        await buffer.add(log_set(user["id"], sets=1, reps=9))
+        await buffer.add(log_set(user["id"], sets=2))
+        await buffer.flush()
+        await buffer.add(log_set(user["id"], sets=2, reps=9))
+        await buffer.flush()
+        return await stored_sets(user["id"])
+
+    assert client.portal.call(scenario) == [(1, 5), (2, 5)]
+    assert metrics.LOG_BUFFER_DUPLICATE_ROWS._value.get() - duplicates_before == 2
+
+
+def test_buffered_post_is_accepted_without_id_until_the_day_is_read(client, monkeypatch):
+    user = create_user(client)
+    # A long interval, so only the read's sync() can have written the set
+    buffer = log_buffer.LogWriteBuffer(flush_interval_seconds=60)
+    monkeypatch.setattr(log_buffer, "log_buffer", buffer)
+    client.portal.call(buffer.start)
+    try:
+        payload = log_set(user["id"], sets=1).model_dump(mode="json")
+        response = client.post("/api/logs/session", json=payload)
+        assert response.status_code == 202
+        assert "id" not in response.json() and response.json()["sets"] == 1
+
+        logs = client.get(f"/api/logs/session/{user['id']}/2026-03-02").json()
+        assert [log["sets"] for log in logs] == [1]
+        response = client.delete(f"/api/logs/session/{logs[0]['id']}", params={"user_id": user["id"]})
+        assert response.status_code == 200
+        assert client.get(f"/api/logs/session/{user['id']}/2026-03-02").json() == []
+    finally:
+        client.portal.call(buffer.stop)
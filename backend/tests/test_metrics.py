@@ -0,0 +1,15 @@
+from conftest import create_user
+
+
+def metric_value(client, sample: str) -> float:
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.split()[-1])
+    return 0.0
+
+
+def test_pool_events_time_connection_holds(client):
+    sample = 'db_pool_connection_hold_seconds_count{engine="primary"}'
+    before = metric_value(client, sample)
+    create_user(client)
+    assert metric_value(client, sample) > before
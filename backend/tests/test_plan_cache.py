@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from app import cache, recommendations
+from conftest import create_plan, create_user
+
+
+def plan_key(user_id: int) -> str:
+    return f"plan:{user_id}"
+
+
+@pytest.fixture
+def planned_user(client, redis_plan_cache):
+    user = create_user(client)
+    plan = create_plan(client, user["id"])
+    # The first read stores the document in the shared backend
+    assert client.get(f"/api/users/{user['id']}/plan/").json() == plan
+    assert plan_key(user["id"]) in redis_plan_cache.entries
+    return user, plan
+
+
+def first_day(plan: dict) -> dict:
+    return next(day for day in plan["weekly_schedule"].values() if day["exercises"])
+
+
+def read_plan(client, user_id: int) -> dict:
+    return client.get(f"/api/users/{user_id}/plan/").json()
+
+
+def test_cache_hit_serves_stored_document(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    redis_plan_cache.entries[plan_key(user["id"])] = (b'{"cached": true}', None)
+    assert read_plan(client, user["id"]) == {"cached": True}
+
+
+def test_update_day_exercise_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    day_exercise = first_day(plan)["exercises"][0]
+    response = client.put(f"/api/workout-day-exercise/{day_exercise['id']}", json={"sets": 9, "reps": "1-2"})
+    assert response.status_code == 200
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
+
+    exercise = next(e for e in first_day(read_plan(client, user["id"]))["exercises"] if e["id"] == day_exercise["id"])
+    assert (exercise["sets"], exercise["reps"]) == (9, "1-2")
+
+
+def test_change_exercise_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    day_exercise = first_day(plan)["exercises"][0]
+    new_exercise_id = 30 if day_exercise["exercise"]["id"] != 30 else 31
+    response = client.put(f"/api/workout-day-exercise/{day_exercise['id']}/change-exercise", json={"new_exercise_id": new_exercise_id})
+    assert response.status_code == 200
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
+
+    exercise = next(e for e in first_day(read_plan(client, user["id"]))["exercises"] if e["id"] == day_exercise["id"])
+    assert exercise["exercise"]["id"] == new_exercise_id
+
+
+def test_delete_day_exercise_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    day = first_day(plan)
+    assert client.delete(f"/api/workout-day-exercise/{day['exercises'][0]['id']}").status_code == 200
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
+
+    assert len(first_day(read_plan(client, user["id"]))["exercises"]) == len(day["exercises"]) - 1
+
+
+def test_add_day_exercise_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    day = first_day(plan)
+    response = client.post(f"/api/workout-day/{day['id']}/exercises", json={"exercise_id": 3, "sets": 3, "reps": "5"})
+    assert response.status_code == 200
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
+
+    assert len(first_day(read_plan(client, user["id"]))["exercises"]) == len(day["exercises"]) + 1
+
+
+def test_edit_day_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    day = first_day(plan)
+    response = client.patch(f"/api/workout-day/{day['id']}", json={"operations": [
+        {"op": "update", "day_exercise_id": day["exercises"][0]["id"], "sets": 7, "reps": "3"},
+    ]})
+    assert response.status_code == 200
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
+
+    assert first_day(read_plan(client, user["id"]))["exercises"][0]["sets"] == 7
+
+
+def test_swap_template_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    day = first_day(plan)
+    response = client.put(f"/api/workout-day/{day['id']}/swap-template", json={"template_id": 3, "user_id": user["id"]})
+    assert response.status_code == 200
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
+
+    swapped = [e["exercise"]["id"] for e in response.json()]
+    assert [e["exercise"]["id"] for e in first_day(read_plan(client, user["id"]))["exercises"]] == swapped
+
+
+def test_regenerating_plan_invalidates(client, planned_user, redis_plan_cache):
+    user, plan = planned_user
+    redis_plan_cache.entries[plan_key(user["id"])] = (b'{"cached": true}', None)
+    regenerated = create_plan(client, user["id"])
+    assert plan_key(user["id"]) in redis_plan_cache.entries
+    assert regenerated["weekly_schedule"].keys() == plan["weekly_schedule"].keys()
+
+
+def test_document_built_before_invalidation_is_not_stored(redis_plan_cache):
+    async def scenario():
+        version = cache.plan_cache.version(-1)
+        await cache.plan_cache.invalidate(-1)
+        await cache.plan_cache.set(-1, b"stale", version)
+        return await cache.plan_cache.get(-1)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_in_memory_entries_expire(monkeypatch):
+    backend = cache.InMemoryLRUBackend()
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+
+    async def scenario():
+        await backend.set("plan:1", b"document", ex=60)
+        fresh = await backend.get("plan:1")
+        now[0] += 61
+        return fresh, await backend.get("plan:1")
+
+    assert asyncio.run(scenario()) == (b"document", None)
+
+
+def test_recommendations_job_invalidates_shared_cache(client, redis_plan_cache):
+    user = create_user(client)
+    create_plan(client, user["id"])
+    read_plan(client, user["id"])
+    assert cache.plan_cache.shared
+    client.portal.call(recommendations.run, 42)
+    assert plan_key(user["id"]) not in redis_plan_cache.entries
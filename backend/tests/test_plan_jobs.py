@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app import plan_jobs, workout_generator
+from conftest import create_user
+
+
+@pytest.fixture
+def gated_generator(monkeypatch):
+    """Replaces plan generation with one that waits for the test to let it finish."""
+    state = {"started": [], "release": None, "result": True}
+
+    async def generate(db, user_id):
+        state["started"].append(user_id)
+        await state["release"].wait()
+        return state["result"]
+
+    monkeypatch.setattr(workout_generator, "generate_and_save_plan_for_user", generate)
+    return state
+
+
+async def wait_until(condition, timeout: float = 5):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_requests_coalesce_while_pending_and_follow_up_once_running(client, gated_generator):
+    user_id = create_user(client)["id"]
+
+    async def scenario():
+        gated_generator["release"] = asyncio.Event()
+        queue = plan_jobs.PlanJobQueue(plan_jobs.InProcessJobBackend(workers=2))
+        await queue.start()
+        try:
+            first = await queue.enqueue(user_id)
+            assert await queue.enqueue(user_id) is first
+
+            await wait_until(lambda: first.status == "running")
+            follow_up = await queue.enqueue(user_id)
+            assert follow_up is not first
+            assert await queue.enqueue(user_id) is follow_up
+
+            # The follow-up waits for the running job even though a worker is free
+            await asyncio.sleep(0.05)
+            assert follow_up.status == "pending" and gated_generator["started"] == [user_id]
+
+            gated_generator["release"].set()
+            await asyncio.wait_for(follow_up.finished.wait(), 5)
+            assert (first.status, follow_up.status) == ("done", "done")
+            assert follow_up.started_at >= first.finished_at
+            assert gated_generator["started"] == [user_id, user_id]
+        finally:
+            await queue.stop()
+
+    client.portal.call(scenario)
+
+
+def test_status_is_readable_from_another_process(client, gated_generator):
+    user_id = create_user(client)["id"]
+
+    async def scenario():
+        gated_generator["release"] = asyncio.Event()
+        gated_generator["result"] = False
+        queue = plan_jobs.PlanJobQueue(plan_jobs.InProcessJobBackend())
+        # Stands in for another worker: it has never seen the job in memory
+        other_process = plan_jobs.PlanJobQueue(plan_jobs.InProcessJobBackend())
+        await queue.start()
+        try:
+            job = await queue.enqueue(user_id)
+            assert (await other_process.get(job.id)).status == "pending"
+            await wait_until(lambda: job.status == "running")
+            assert (await other_process.get(job.id)).status == "running"
+
+            gated_generator["release"].set()
+            await asyncio.wait_for(job.finished.wait(), 5)
+            stored = await other_process.get(job.id)
+            assert (stored.status, stored.error) == ("failed", "User or plan details not found")
+            assert stored.finished_at is not None
+        finally:
+            await queue.stop()
+
+    client.portal.call(scenario)
+
+
+def test_job_endpoint(client):
+    user_id = create_user(client)["id"]
+    response = client.post(f"/api/users/{user_id}/plan/", json={"workout_type": "gym", "sessions_per_week": 3, "hours_per_session": 1})
+    assert response.status_code == 202
+    job = response.json()["job"]
+    assert response.headers["location"] == f"/api/plan-jobs/{job['id']}"
+    assert client.get(f"/api/plan-jobs/{job['id']}").json()["user_id"] == user_id
+    assert client.get("/api/plan-jobs/unknown").status_code == 404
@@ -0,0 +1,32 @@
+import os
+
+from fastapi import Request
+
+from app import profiling
+
+
+def fake_request(path: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""})
+
+
+def test_abandoned_profile_does_not_block_later_ones(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_active", None)
+    first = profiling._start(fake_request("/disconnected"))
+    assert first is not None
+
+    # The first response never finished sending; while it is recent, others are skipped
+    assert profiling._start(fake_request("/skipped")) is None
+    assert "Not profiling GET /skipped" in capsys.readouterr().out
+
+    monkeypatch.setattr(profiling, "PROFILE_TIMEOUT_SECONDS", 0)
+    second = profiling._start(fake_request("/next"))
+    assert second is not None and second is not first
+    assert "Abandoning profile" in capsys.readouterr().out
+
+    # A late finish of the abandoned profile neither writes it nor frees the new one's slot
+    profiling._finish(first, fake_request("/disconnected"), 200)
+    assert profiling._active is second
+    profiling._finish(second, fake_request("/next"), 200)
+    assert profiling._active is None
+    assert sorted(os.listdir(tmp_path)) == [f"{second.id}.folded", f"{second.id}.json"]
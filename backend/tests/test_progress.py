@@ -0,0 +1,47 @@
+from datetime import date
+
+from conftest import create_user
+
+DAY = date(2026, 4, 6)
+
+
+def log_set(user_id: int, sets: int, reps: int = 8, weight_kg: float = 60, day: date = DAY, exercise_id: int = 1) -> dict:
+    return {"user_id": user_id, "exercise_id": exercise_id, "date": day.isoformat(), "sets": sets, "reps": reps, "weight_kg": weight_kg}
+
+
+def daily_progress(client, user_id: int) -> list:
+    response = client.get(f"/api/users/{user_id}/progress", params={"period": "day"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_rollups_follow_writes_and_deletes(client):
+    user_id = create_user(client)["id"]
+    client.post("/api/logs/session/batch", json=[
+        log_set(user_id, 1, reps=10, weight_kg=50),
+        log_set(user_id, 2, reps=8, weight_kg=60),
+        log_set(user_id, 1, reps=5, weight_kg=100, exercise_id=2),
+    ])
+    single = client.post("/api/logs/session", json=log_set(user_id, 3, reps=6, weight_kg=60)).json()
+
+    progress = {point["exercise_id"]: point for point in daily_progress(client, user_id)}
+    assert progress[1] == {
+        "exercise_id": 1, "period_start": DAY.isoformat(), "set_count": 3, "total_reps": 24,
+        "volume_kg": 10 * 50 + 8 * 60 + 6 * 60, "top_weight_kg": 60.0, "estimated_1rm_kg": 76.0,
+    }
+    assert progress[2]["set_count"] == 1
+
+    assert client.delete(f"/api/logs/session/{single['id']}", params={"user_id": user_id}).status_code == 200
+    progress = {point["exercise_id"]: point for point in daily_progress(client, user_id)}
+    assert (progress[1]["set_count"], progress[1]["volume_kg"]) == (2, 10 * 50 + 8 * 60)
+
+
+def test_weekly_progress_sums_days(client):
+    user_id = create_user(client)["id"]
+    client.post("/api/logs/session/batch", json=[
+        log_set(user_id, 1, day=date(2026, 4, 6)),
+        log_set(user_id, 1, day=date(2026, 4, 8)),
+        log_set(user_id, 1, day=date(2026, 4, 13)),
+    ])
+    weeks = client.get(f"/api/users/{user_id}/progress").json()
+    assert [(week["period_start"], week["set_count"]) for week in weeks] == [("2026-04-06", 2), ("2026-04-13", 1)]
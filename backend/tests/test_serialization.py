@@ -0,0 +1,53 @@
+from datetime import date
+
+from pydantic import TypeAdapter
+
+from app import models, schemas, serialization
+from conftest import create_plan, create_user
+
+
+def test_serializer_matches_validated_dump():
+    exercise = models.Exercise(id=3, name="Bench Press", type="Compound", muscle_group_id=1)
+    day = models.WorkoutDay(id=1, user_id=1, day_of_week="Monday")
+    day.exercises = [models.WorkoutDayExercise(id=1, workout_day_id=1, exercise_id=3, sets=4, reps="8-12", exercise=exercise)]
+    log = models.WorkoutSessionLog(id=1, user_id=1, exercise_id=3, date=date(2026, 4, 6), sets=1, reps=8, weight_kg=60)
+    plan = {
+        # Integer column behind a float field
+        "plan_details": models.WorkoutPlan(id=1, workout_type="gym", sessions_per_week=3, hours_per_session=1, user_id=1),
+        "weekly_schedule": {"Monday": day},
+    }
+    cases = [
+        (serialization.WORKOUT_PLAN, plan),
+        (serialization.SESSION_LOG_RANGE, {"days": {log.date: [log]}, "next_cursor": None}),
+        (serialization.WORKOUT_DAY_EXERCISE_LIST, day.exercises),
+    ]
+    for serializer, data in cases:
+        adapter = TypeAdapter(serializer.annotation)
+        assert serializer.to_json(data) == adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def test_endpoints_return_their_response_model(client):
+    user_id = create_user(client)["id"]
+    plan = create_plan(client, user_id)
+    assert plan["plan_details"]["hours_per_session"] == 1.0
+
+    day = next(day for day in plan["weekly_schedule"].values() if day["exercises"])
+    day_exercise = day["exercises"][0]
+    client.post("/api/logs/session", json={
+        "user_id": user_id, "exercise_id": day_exercise["exercise_id"], "date": "2026-04-06",
+        "sets": 1, "reps": 8, "weight_kg": 60, "notes": "felt strong",
+    })
+
+    responses = [
+        (schemas.WorkoutDayExercise, client.put(f"/api/workout-day-exercise/{day_exercise['id']}", json={"sets": 5, "reps": "5"})),
+        (schemas.WorkoutDay, client.patch(f"/api/workout-day/{day['id']}", json={"operations": []})),
+        (schemas.PlanPreviewResponse, client.post("/api/plan/preview", json={"sessions_per_week": 3, "goal": 5, "seed": 1})),
+        (schemas.NotesSearchResponse, client.get(f"/api/users/{user_id}/logs/search", params={"q": "strong"})),
+        (schemas.ExerciseSearchResponse, client.get("/api/exercises/search", params={"q": "press"})),
+        (list[schemas.ExerciseProgressPoint], client.get(f"/api/users/{user_id}/progress")),
+        (list[schemas.MuscleGroupVolumeWeek], client.get(f"/api/users/{user_id}/volume", params={"to": "2026-04-06"})),
+    ]
+    for response_model, response in responses:
+        assert response.status_code == 200, response.text
+        adapter = TypeAdapter(response_model)
+        assert response.json() == adapter.dump_python(adapter.validate_json(response.content), mode="json")
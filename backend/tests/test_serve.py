@@ -0,0 +1,52 @@
+import asyncio
+import sys
+
+import pytest
+
+from app import bootstrap, database, serve
+from conftest import FakeRedis
+
+
+def run_serve(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["app.serve", *args])
+    # Restored afterwards, like everything else main() sets in the environment
+    monkeypatch.delenv(bootstrap.PREPARED_ENV, raising=False)
+    monkeypatch.setattr(serve.uvicorn, "run", lambda *a, **kw: None)
+    monkeypatch.setattr(serve, "prepare", lambda: asyncio.sleep(0))
+    for variable in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW"):
+        monkeypatch.delenv(variable, raising=False)
+    serve.main()
+
+
+def test_multiple_workers_refused_without_shared_state(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql+asyncpg://db/fitify")
+    monkeypatch.delenv("PLAN_CACHE_REDIS_URL", raising=False)
+    with pytest.raises(SystemExit):
+        run_serve(monkeypatch, "--workers", "4")
+    assert serve.multi_worker_problems() == [
+        "PLAN_CACHE_REDIS_URL is not set, so plan caches and read-your-writes are per process",
+    ]
+
+
+def test_multiple_workers_allowed_with_postgres_and_redis(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql+asyncpg://db/fitify")
+    monkeypatch.setenv("PLAN_CACHE_REDIS_URL", "redis://cache:6379/0")
+    run_serve(monkeypatch, "--workers", "4", "--max-db-connections", "80")
+    assert serve.multi_worker_problems() == []
+
+
+def test_sqlite_is_single_worker(monkeypatch):
+    monkeypatch.setenv("PLAN_CACHE_REDIS_URL", "redis://cache:6379/0")
+    assert len(serve.multi_worker_problems()) == 1
+
+
+def test_redis_recent_writes_expire_with_the_window():
+    recent_writes = database.RedisRecentWrites(FakeRedis(), window_seconds=0.05)
+
+    async def scenario():
+        await recent_writes.record(7)
+        during = await recent_writes.is_recent(7), await recent_writes.is_recent(8)
+        await asyncio.sleep(0.1)
+        return during, await recent_writes.is_recent(7)
+
+    assert asyncio.run(scenario()) == ((True, False), False)
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app import bootstrap, database, models, partitions
+from conftest import create_user
+
+DAY = date(2026, 4, 6)
+
+
+def log_set(user_id: int, sets: int, reps: int = 8, weight_kg: float = 60, day: date = DAY, exercise_id: int = 1) -> dict:
+    return {"user_id": user_id, "exercise_id": exercise_id, "date": day.isoformat(), "sets": sets, "reps": reps, "weight_kg": weight_kg}
+
+
+def daily_progress(client, user_id: int) -> list:
+    response = client.get(f"/api/users/{user_id}/progress", params={"period": "day"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_batch_skips_sets_already_logged(client):
+    user_id = create_user(client)["id"]
+    batch = [log_set(user_id, 1), log_set(user_id, 1, reps=99), log_set(user_id, 2)]
+
+    first = client.post("/api/logs/session/batch", json=batch).json()
+    assert [(log["sets"], log["reps"]) for log in first["created"]] == [(1, 8), (2, 8)]
+    # The repeat within the batch is reported as the set that was stored
+    assert [log["id"] for log in first["duplicates"]] == [first["created"][0]["id"]]
+
+    retry = client.post("/api/logs/session/batch", json=batch + [log_set(user_id, 3)]).json()
+    assert [log["sets"] for log in retry["created"]] == [3]
+    stored_ids = {log["sets"]: log["id"] for log in first["created"]}
+    assert [log["id"] for log in retry["duplicates"]] == [stored_ids[1], stored_ids[1], stored_ids[2]]
+
+    logs = client.get(f"/api/logs/session/{user_id}/{DAY.isoformat()}").json()
+    assert sorted(log["sets"] for log in logs) == [1, 2, 3]
+
+
+def test_startup_refuses_duplicate_sets_until_they_are_deduped(client, capsys):
+    user_id = create_user(client)["id"]
+    first = client.post("/api/logs/session", json=log_set(user_id, 1, reps=10)).json()
+
+    async def store_duplicate():
+        # A database from before the unique set index existed
+        async with database.engine.begin() as conn:
+            await conn.execute(text("DROP INDEX uq_workout_session_logs_set"))
+        async with database.SessionLocal() as db:
+            db.add(models.WorkoutSessionLog(user_id=user_id, exercise_id=1, date=DAY, sets=1, reps=12, weight_kg=60))
+            await db.commit()
+
+    client.portal.call(store_duplicate)
+    with pytest.raises(RuntimeError, match="1 session logs repeat a set"):
+        client.portal.call(bootstrap.prepare_database)
+
+    client.portal.call(partitions.dedupe, True)
+    assert "Would delete 1 duplicate session logs" in capsys.readouterr().out
+    client.portal.call(partitions.dedupe, False)
+    output = capsys.readouterr().out
+    assert "exercise 1, 2026-04-06 set 1, 12 x 60.0 kg" in output and "Deleted 1 duplicate" in output
+
+    client.portal.call(bootstrap.prepare_database)
+    logs = client.get(f"/api/logs/session/{user_id}/{DAY.isoformat()}").json()
+    assert [log["id"] for log in logs] == [first["id"]]
+    assert daily_progress(client, user_id)[0]["set_count"] == 1
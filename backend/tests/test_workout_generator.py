@@ -0,0 +1,25 @@
+import random
+
+import pytest
+
+from app import database, workout_generator
+
+
+def test_exercise_pool_is_shared_as_read_only_rows(client):
+    async def load_pool():
+        async with database.SessionLocal() as db:
+            return await workout_generator.get_exercise_pool(db)
+
+    pool = client.portal.call(load_pool)
+    # The session that loaded the pool is closed; its rows must still be usable
+    exercise = pool["Chest"][0]
+    assert isinstance(exercise, workout_generator.PoolExercise)
+    assert exercise.muscle_group == "Chest" and exercise.name
+    with pytest.raises(TypeError):
+        pool["Chest"] = ()
+    with pytest.raises(AttributeError):
+        exercise.name = "Renamed"
+
+    plan = workout_generator.build_weekly_plan(pool, 3, 5, random.Random(1))
+    assert plan == workout_generator.build_weekly_plan(client.portal.call(load_pool), 3, 5, random.Random(1))
+    assert all(isinstance(exercise, workout_generator.PoolExercise) for _, exercises in plan for exercise in exercises)
@@ -61,12 +61,24 @@ export interface WorkoutDay {
     exercises: WorkoutDayExercise[];
 }
 
+export interface ExerciseRecommendation {
+  exercise_id: number;
+  target_weight_kg: number;
+  target_reps: number;
+  estimated_1rm_kg: number;
+  last_session_date: string;
+}
+
 export interface WorkoutPlanResponse {
   plan_details: WorkoutPlan;
   // This now expects a more detailed object from the backend
   weekly_schedule: {
     [key: string]: WorkoutDay;
   };
+  // Next-session targets from the nightly job, keyed by exercise ID
+  recommendations: {
+    [exerciseId: number]: ExerciseRecommendation;
+  };
 }
 
 export interface LogData {
@@ -76,6 +88,7 @@ export interface LogData {
     sets: number;
     reps: number;
     weight_kg: number;
+    notes?: string | null;
 }
 
 export interface LoggedSet extends LogData {
@@ -102,6 +115,33 @@ export const createUser = async (userData: UserData): Promise<User> => {
   return response.json();
 };
 
+export interface PlanGenerationJob {
+  id: string;
+  user_id: number;
+  status: 'pending' | 'running' | 'done' | 'failed';
+  error?: string | null;
+  created_at: string;
+  started_at?: string | null;
+  finished_at?: string | null;
+}
+
+// Resolves to null when the server no longer knows the job, e.g. after it was purged
+export const getPlanGenerationJob = async (jobId: string): Promise<PlanGenerationJob | null> => {
+  const response = await fetch(`${API_BASE_URL}/plan-jobs/${jobId}`);
+  if (response.status === 404) {
+    return null;
+  }
+  if (!response.ok) {
+    throw new Error(`Failed to fetch plan generation status: ${response.statusText}`);
+  }
+  return response.json();
+};
+
+const PLAN_JOB_POLL_INTERVAL_MS = 500;
+// Generation normally takes a second or two; past this, stop waiting and let the user come back later
+const PLAN_JOB_TIMEOUT_MS = 60_000;
+
+// Saves the plan details, then waits for the server to finish generating the weekly schedule
 export const createWorkoutPlan = async (userId: number, planData: WorkoutPlanData): Promise<WorkoutPlan> => {
   const response = await fetch(`${API_BASE_URL}/users/${userId}/plan/`, {
     method: 'POST',
@@ -112,7 +152,29 @@ export const createWorkoutPlan = async (userId: number, planData: WorkoutPlanDat
     const errorData = await response.json().catch(() => ({ detail: response.statusText }));
     throw new Error(`Failed to create workout plan: ${errorData.detail || response.statusText}`);
   }
-  return response.json();
+  const { plan_details, job }: { plan_details: WorkoutPlan, job: PlanGenerationJob } = await response.json();
+
+  const deadline = Date.now() + PLAN_JOB_TIMEOUT_MS;
+  let status: PlanGenerationJob | null = job;
+  while (status !== null && (status.status === 'pending' || status.status === 'running')) {
+    if (Date.now() > deadline) {
+      throw new Error('Your workout plan is still being generated, please check back in a minute');
+    }
+    await new Promise(resolve => setTimeout(resolve, PLAN_JOB_POLL_INTERVAL_MS));
+    status = await getPlanGenerationJob(job.id);
+  }
+  if (status === null) {
+    // The job is gone, so the plan itself has to tell whether a weekly schedule was generated
+    const plan = await getWorkoutPlan(userId);
+    if (Object.keys(plan.weekly_schedule).length === 0) {
+      throw new Error('Failed to generate workout plan: the generation job was lost, please try again');
+    }
+    return plan_details;
+  }
+  if (status.status === 'failed') {
+    throw new Error(`Failed to generate workout plan: ${status.error || 'unknown error'}`);
+  }
+  return plan_details;
 };
 
 export const getWorkoutPlan = async (userId: number): Promise<WorkoutPlanResponse> => {
@@ -123,6 +185,30 @@ export const getWorkoutPlan = async (userId: number): Promise<WorkoutPlanRespons
   return response.json();
 };
 
+export interface PlanPreviewExercise {
+  exercise_id: number;
+  sets: number;
+  reps: string;
+  exercise: Exercise;
+}
+
+export interface PlanPreview {
+  seed: number; // Send it back to get the same plan again
+  weekly_schedule: Record<string, PlanPreviewExercise[]>;
+}
+
+export const previewWorkoutPlan = async ({ sessionsPerWeek, goal, seed }: { sessionsPerWeek: number, goal: number, seed?: number }): Promise<PlanPreview> => {
+  const response = await fetch(`${API_BASE_URL}/plan/preview`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ sessions_per_week: sessionsPerWeek, goal, seed }),
+  });
+  if (!response.ok) {
+    throw new Error(`Failed to preview workout plan: ${response.statusText}`);
+  }
+  return response.json();
+};
+
 export const getAllExercises = async (muscleGroupIds?: number[]): Promise<Exercise[]> => {
     let url = `${API_BASE_URL}/exercises/`;
     if (muscleGroupIds && muscleGroupIds.length > 0) {
@@ -149,7 +235,10 @@ export const changeExerciseInPlan = async ({ dayExerciseId, newExerciseId }: { d
     return response.json();
 };
 
-export const logWorkoutSet = async (logData: LogData) => {
+// Resolves to null when the server buffers the set (202 Accepted, LOG_WRITE_MODE=buffered):
+// it has no id yet. getLogsForDate waits for the user's buffered sets, so refetch the day
+// to get the id needed by deleteLoggedSet.
+export const logWorkoutSet = async (logData: LogData): Promise<LoggedSet | null> => {
     const response = await fetch(`${API_BASE_URL}/logs/session`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
@@ -158,6 +247,26 @@ export const logWorkoutSet = async (logData: LogData) => {
     if (!response.ok) {
         throw new Error(`Failed to log set: ${response.statusText}`);
     }
+    if (response.status === 202) {
+        return null;
+    }
+    return response.json();
+};
+
+export interface LogBatchResult {
+    created: LoggedSet[];
+    duplicates: LoggedSet[]; // Sets that were already logged, e.g. by a retried request
+}
+
+export const logWorkoutSetsBatch = async (logs: LogData[]): Promise<LogBatchResult> => {
+    const response = await fetch(`${API_BASE_URL}/logs/session/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(logs),
+    });
+    if (!response.ok) {
+        throw new Error(`Failed to log sets: ${response.statusText}`);
+    }
     return response.json();
 };
 
@@ -171,6 +280,39 @@ export const getLogsForDate = async (userId: number, date: string): Promise<Logg
     return text ? JSON.parse(text) : []; // Handle empty response body
 };
 
+export interface LogRangePage {
+    days: { [date: string]: LoggedSet[] }; // YYYY-MM-DD -> sets logged that day
+    next_cursor: string | null;
+}
+
+export const getLogsForRange = async (userId: number, from: string, to: string, cursor?: string): Promise<LogRangePage> => {
+    const params = new URLSearchParams({ from, to });
+    if (cursor) params.append('cursor', cursor);
+    const response = await fetch(`${API_BASE_URL}/logs/session/${userId}?${params.toString()}`);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch logs: ${response.statusText}`);
+    }
+    return response.json();
+};
+
+export interface NotesSearchHit extends LoggedSet {
+    score: number;
+}
+
+export interface NotesSearchPage {
+    results: NotesSearchHit[];
+    next_offset: number | null;
+}
+
+export const searchLogNotes = async (userId: number, query: string, offset = 0): Promise<NotesSearchPage> => {
+    const params = new URLSearchParams({ q: query, offset: String(offset) });
+    const response = await fetch(`${API_BASE_URL}/users/${userId}/logs/search?${params.toString()}`);
+    if (!response.ok) {
+        throw new Error(`Failed to search notes: ${response.statusText}`);
+    }
+    return response.json();
+};
+
 export const deleteLoggedSet = async ({ logId, userId }: { logId: number, userId: number }) => {
     const response = await fetch(`${API_BASE_URL}/logs/session/${logId}?user_id=${userId}`, {
         method: 'DELETE',
@@ -181,6 +323,25 @@ export const deleteLoggedSet = async ({ logId, userId }: { logId: number, userId
     return response.json();
 };
 
+export type WorkoutDayEditOperation =
+    | { op: 'update'; day_exercise_id: number; sets: number; reps: string }
+    | { op: 'replace'; day_exercise_id: number; exercise_id: number }
+    | { op: 'remove'; day_exercise_id: number }
+    | { op: 'add'; exercise_id: number; sets: number; reps: string };
+
+// Applies all operations in order in a single request; either all of them succeed or none do.
+export const editWorkoutDay = async ({ dayId, operations }: { dayId: number, operations: WorkoutDayEditOperation[] }): Promise<WorkoutDay> => {
+    const response = await fetch(`${API_BASE_URL}/workout-day/${dayId}`, {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operations }),
+    });
+    if (!response.ok) {
+        throw new Error(`Failed to edit workout day: ${response.statusText}`);
+    }
+    return response.json();
+};
+
 // --- NEW FUNCTIONS FOR TEMPLATE CUSTOMIZATION ---
 
 export const getWorkoutTemplates = async (): Promise<WorkoutTemplate[]> => {
@@ -16,6 +16,8 @@ const SetLogger: React.FC<SetLoggerProps> = ({ userId, exerciseId, sets, setSets
   
   const logSetMutation = useMutation({
     mutationFn: logWorkoutSet,
+    // Always refetch the day's logs: a buffered set is only returned without its id,
+    // and the refetch is what gives the checkbox the id to delete it with
     onSuccess: () => onLogChange(),
     onError: (error) => {
       console.error("Failed to log set:", error);